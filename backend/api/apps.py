@@ -1,6 +1,15 @@
+import django
 from django.apps import AppConfig
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .db_router import close_unusable_connections
+
+        if django.VERSION < (4, 1):
+            request_started.connect(close_unusable_connections)
@@ -0,0 +1,34 @@
+from django.urls import path
+
+from api.async_views import read_view
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+
+urlpatterns = [
+    path('recipes/',
+         read_view(RecipeViewSet, {'get': 'list', 'post': 'create'},
+                   basename='recipes')),
+    path('recipes/feed/',
+         read_view(RecipeViewSet, {'get': 'feed'}, basename='recipes')),
+    path('recipes/download_shopping_cart/',
+         read_view(RecipeViewSet, {'get': 'download_shopping_cart'},
+                   basename='recipes', stream_exports=False)),
+    path('recipes/<int:pk>/',
+         read_view(RecipeViewSet,
+                   {'get': 'retrieve', 'put': 'update',
+                    'patch': 'partial_update', 'delete': 'destroy'},
+                   basename='recipes', detail=True)),
+    path('tags/',
+         read_view(TagViewSet, {'get': 'list'}, basename='tags')),
+    path('tags/<int:pk>/',
+         read_view(TagViewSet, {'get': 'retrieve'}, basename='tags',
+                   detail=True)),
+    path('ingredients/',
+         read_view(IngredientViewSet, {'get': 'list'},
+                   basename='ingredients')),
+    path('ingredients/<int:pk>/',
+         read_view(IngredientViewSet, {'get': 'retrieve'},
+                   basename='ingredients', detail=True)),
+    path('users/subscriptions/',
+         read_view(UserViewSet, {'get': 'subscriptions'},
+                   basename='users')),
+]
@@ -0,0 +1,62 @@
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from .middleware import current_recorder
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def offload(func):
+    """Выполняет func в пуле потоков, не занимая event loop.
+
+    thread_sensitive=False, чтобы чтения не выстраивались в очередь
+    к одному потоку. Сигналы request_started/request_finished в
+    потоки пула не приходят, поэтому соединения с базой проверяются
+    и закрываются здесь же. Execute_wrapper профилирующего middleware
+    стоит только на соединениях его потока, поэтому recorder запроса
+    ставится и на соединения потока из пула.
+    """
+    def run(*args, **kwargs):
+        recorder = current_recorder.get()
+        close_old_connections()
+        try:
+            with recorder.installed() if recorder else nullcontext():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def render(response):
+    if callable(getattr(response, 'render', None)):
+        response.render()
+    return response
+
+
+def read_view(viewset, actions, basename, detail=False, **initkwargs):
+    """Async-view поверх действий ViewSet для ASGI-режима.
+
+    Чтение (аутентификация, запросы, сериализация и рендеринг) уходит
+    в пул потоков одним вызовом. Запись выполняется так же, как
+    обычная синхронная view под ASGI.
+    """
+    for name in actions.values():
+        initkwargs = {
+            **getattr(getattr(viewset, name), 'kwargs', {}), **initkwargs
+        }
+    sync_view = viewset.as_view(
+        actions, basename=basename, detail=detail, **initkwargs
+    )
+    read = offload(lambda *args, **kwargs: render(sync_view(*args, **kwargs)))
+    write = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
@@ -0,0 +1,105 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+TOKEN_KEY = 'foodgram:token:{}'
+# Поля пользователя, которые хранятся в кэше токенов. Остальные
+# (пароль, last_login, ...) загружаются из базы при обращении.
+# Порядок — как в модели: его ожидает Model.from_db.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'username', 'email', 'first_name',
+                         'last_name', 'is_active', 'is_staff',
+                         'is_superuser')
+)
+
+
+def token_cache_key(key):
+    # В общий кэш ключ токена не попадает в открытом виде.
+    return TOKEN_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+def forget_token(key):
+    """Удаляет запись токена из общего кэша: следующий запрос с ним
+    снова прочитает токен и пользователя из базы."""
+    cache.delete(token_cache_key(key))
+
+
+class TokenLRU:
+    """Ограниченный LRU-кэш токенов в памяти процесса."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, values):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, entry_values, user = entry
+            if entry_values != values or expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return user
+
+    def set(self, key, values, user, timeout):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, values, user)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_lru = TokenLRU(settings.AUTH_TOKEN_CACHE_SIZE)
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса Token JOIN User на каждый запрос.
+
+    В общем кэше под хэшем ключа токена лежит проекция пользователя
+    USER_FIELDS — без пароля и прочих полей, которые не нужны для
+    аутентификации. Из неё в LRU процесса собирается пользователь с
+    отложенными остальными полями. Запись LRU используется, пока
+    совпадает с проекцией из общего кэша: удаление или изменение
+    токена и пользователя удаляют запись токена (forget_token), и
+    старые объекты перестают использоваться сразу во всех процессах.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        values = cache.get(cache_key)
+        if values is None:
+            user, _ = super().authenticate_credentials(key)
+            values = tuple(getattr(user, field) for field in USER_FIELDS)
+            cache.set(cache_key, values, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        user = token_lru.get(key, values)
+        if user is None:
+            user = User.from_db(router.db_for_read(User), USER_FIELDS, values)
+            token_lru.set(
+                key, values, user, settings.AUTH_TOKEN_LOCAL_TIMEOUT
+            )
+        # Копия, чтобы параллельные запросы не делили один объект
+        # request.user.
+        user = copy.copy(user)
+        token = Token.from_db(
+            router.db_for_read(Token), ('key', 'user_id'), (key, user.pk)
+        )
+        token.user = user
+        return user, token
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'foodgram:version:{}'
+RECIPES_VERSION = 'recipes'
+TAGS_VERSION = 'tags'
+
+
+def initial_version():
+    # Версия, потерянная при перезапуске или вытеснении из кэша, не
+    # начинается снова с 1: иначе ожили бы старые записи и файлы под
+    # тем же номером.
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """Версия набора данных, общая для всех процессов."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        version = initial_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(name):
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = initial_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+class AnonymousResponseCacheMixin:
+    """Кэширует ответы list/retrieve для анонимных пользователей.
+
+    Ключ строится из версии набора данных, действия, pk и
+    отсортированных параметров cache_query_params. Смена версии
+    делает все старые записи недоступными.
+    """
+    cache_version_name = None
+    cache_query_params = ()
+
+    def get_cache_key(self, request):
+        params = urlencode([
+            (name, value)
+            for name in sorted(self.cache_query_params)
+            for value in sorted(set(request.query_params.getlist(name)))
+        ])
+        return ':'.join((
+            'foodgram', self.basename,
+            str(get_version(self.cache_version_name)),
+            request.get_host(), self.action,
+            str(self.kwargs.get('pk', '')), params,
+        ))
+
+    def cached_response(self, request, render):
+        if not request.user.is_anonymous:
+            return render()
+        key = self.get_cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            response = render()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            content = json.dumps(response.data, sort_keys=True, default=str)
+            entry = {
+                'data': response.data,
+                'etag': f'"{hashlib.md5(content.encode()).hexdigest()}"',
+                'last_modified': int(time.time()),
+            }
+            cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+        headers = {
+            'ETag': entry['etag'],
+            'Last-Modified': http_date(entry['last_modified']),
+            'Vary': 'Authorization',
+        }
+        if self.not_modified(request, entry):
+            return Response(status=status.HTTP_304_NOT_MODIFIED,
+                            headers=headers)
+        return Response(entry['data'], headers=headers)
+
+    @staticmethod
+    def not_modified(request, entry):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return entry['etag'] in (
+                tag.strip() for tag in if_none_match.split(',')
+            )
+        if_modified_since = parse_http_date_safe(
+            request.headers.get('If-Modified-Since', '')
+        )
+        return (if_modified_since is not None
+                and entry['last_modified'] <= if_modified_since)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(
+                AnonymousResponseCacheMixin, self
+            ).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(
+                AnonymousResponseCacheMixin, self
+            ).retrieve(request, *args, **kwargs)
+        )
+
+
+class ReferencePayload:
+    """Сериализованный в JSON справочник, хранящийся в памяти процесса.
+
+    Пересобирается только при смене версии в общем кэше.
+    """
+
+    def __init__(self, version_name):
+        self.version_name = version_name
+        self.payload = None
+        self.lock = threading.Lock()
+
+    def get(self, build):
+        version = get_version(self.version_name)
+        payload = self.payload
+        if payload is not None and payload['version'] == version:
+            return payload
+        with self.lock:
+            if self.payload is None or self.payload['version'] != version:
+                self.payload = self.render(version, build())
+            return self.payload
+
+    @staticmethod
+    def render(version, data):
+        def encode(value):
+            content = json.dumps(value, ensure_ascii=False).encode()
+            return content, f'"{hashlib.sha1(content).hexdigest()}"'
+
+        return {
+            'version': version,
+            'list': encode(data),
+            'items': {row['id']: encode(row) for row in data},
+        }
+
+
+class ReferenceDataMixin:
+    """Отдаёт list/retrieve справочника из ReferencePayload без
+    обращения к базе. Запросы с фильтрами обрабатываются как обычно."""
+    reference_payload = None
+
+    def build_reference_data(self):
+        return self.get_serializer(self.get_queryset(), many=True).data
+
+    def reference_response(self, request, content, etag):
+        if etag in (tag.strip() for tag in
+                    request.headers.get('If-None-Match', '').split(',')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={settings.REFERENCE_CACHE_MAX_AGE}'
+        )
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        payload = self.reference_payload.get(self.build_reference_data)
+        return self.reference_response(request, *payload['list'])
+
+    def retrieve(self, request, *args, **kwargs):
+        payload = self.reference_payload.get(self.build_reference_data)
+        try:
+            item = payload['items'][int(self.kwargs['pk'])]
+        except (KeyError, ValueError):
+            return super().retrieve(request, *args, **kwargs)
+        return self.reference_response(request, *item)
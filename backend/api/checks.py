@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """Кэш в памяти процесса не общий для воркеров: версии данных,
+    throttling и инвалидация токенов работали бы в каждом свой."""
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] not in (
+            LOCAL_CACHES):
+        return []
+    return [Warning(
+        'Кэш по умолчанию хранится в памяти процесса.',
+        hint='Задайте CACHE_LOCATION=redis://<host>:6379/1 '
+             '(сервис redis в infra/docker-compose.yml).',
+        id='api.W001',
+    )]
@@ -1,26 +1,48 @@
-import io
+import os
+import tempfile
+from functools import lru_cache
 
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
+FONT_NAME = 'FreeSans'
+FONT_PATH = os.path.join(os.path.dirname(__file__), 'FreeSans.ttf')
+PAGE_TOP = 810
+PAGE_BOTTOM = 40
+LINE_HEIGHT = 20
+SPOOL_MAX_SIZE = 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def register_font():
+    """Шрифт разбирается с диска один раз на процесс."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+    return FONT_NAME
+
 
 def create_pdf(title, ingredients):
+    """Возвращает файл с PDF, готовый к потоковой отдаче.
 
-    buffer = io.BytesIO()
+    Небольшие документы остаются в памяти, большие сбрасываются
+    во временный файл на диске.
+    """
+    font = register_font()
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
     p = canvas.Canvas(buffer, pagesize=A4)
 
-    pdfmetrics.registerFont(
-        TTFont('FreeSans', 'api/FreeSans.ttf'))
-    p.setFont('FreeSans', 20)
-    y = 810
+    p.setFont(font, 20)
+    y = PAGE_TOP
     p.drawString(55, y, f'{title}')
     y -= 30
 
-    p.setFont('FreeSans', 14)
-    string_number = 1
-    for ingredient in ingredients:
+    p.setFont(font, 14)
+    for string_number, ingredient in enumerate(ingredients, start=1):
+        if y < PAGE_BOTTOM:
+            p.showPage()
+            p.setFont(font, 14)
+            y = PAGE_TOP
         p.drawString(
             15, y,
             (f'{string_number}.'
@@ -28,8 +50,7 @@ def create_pdf(title, ingredients):
              f'({ingredient.measurement_unit}) - {ingredient.amount}'
              )
         )
-        y -= 20
-        string_number += 1
+        y -= LINE_HEIGHT
 
     p.showPage()
     p.save()
@@ -1,7 +1,141 @@
+import hashlib
 
-from rest_framework.pagination import PageNumberPagination
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .cache import RECIPES_VERSION, get_version
+from .filters import POPULAR_ORDERING
+
+
+class CachedCountPaginator(Paginator):
+    """Кэширует COUNT(*) отфильтрованного запроса на короткое время.
+
+    Ключ включает версию рецептов, так что после их изменения count
+    считается заново.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super().count
+        try:
+            sql = str(query)
+        except EmptyResultSet:
+            return 0
+        key = 'foodgram:count:{}:{}'.format(
+            get_version(RECIPES_VERSION), hashlib.md5(sql.encode()).hexdigest()
+        )
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def validate_number(self, number):
+        """Без верхней границы: её проверяет page() по самому срезу."""
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        return number
+
+    def page(self, number):
+        """Страница не сверяется с count: устаревшее значение из кэша
+        не должно ни обрезать последнюю страницу, ни отвечать 404 на
+        только что появившуюся."""
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page + self.orphans
+        page = self._get_page(self.object_list[bottom:top], number, self)
+        if number > 1 and not page:
+            raise EmptyPage(_('That page contains no results'))
+        return page
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    page_size = 6
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        """Порядок курсора должен совпадать с порядком RecipeFilter.
+
+        Релевантность поиска в курсор не кодируется, поэтому поиск без
+        ?ordering=popular листается только через page.
+        """
+        if request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        if request.query_params.get('search'):
+            raise ValidationError({self.cursor_query_param: (
+                'Результаты поиска упорядочены по релевантности, '
+                'используйте page'
+            )})
+        return super().get_ordering(request, queryset, view)
+
+
+class SubscriptionCursorPagination(RecipeCursorPagination):
+    ordering = ('-follow_id',)
+
+
+class CursorOptInMixin:
+    """Переключает на курсорную пагинацию, если в запросе есть cursor.
+
+    Без него работает обычный контракт page/limit.
+    """
+    cursor_pagination_class = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if self.cursor_pagination_class.cursor_query_param in (
+                request.query_params):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipePagination(CursorOptInMixin, CustomPagination):
+    """count кэшируется, кроме списков с фильтром по избранному или
+    корзине: они свои у каждого пользователя и меняются с каждым
+    его добавлением или удалением."""
+    cursor_pagination_class = RecipeCursorPagination
+    user_relation_params = ('is_favorited', 'is_in_shopping_cart')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = (
+            Paginator if any(param in request.query_params
+                             for param in self.user_relation_params)
+            else CachedCountPaginator
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+
+class SubscriptionPagination(CursorOptInMixin, CustomPagination):
+    cursor_pagination_class = SubscriptionCursorPagination
+
+
+class FeedPagination(CursorOptInMixin, CustomPagination):
+    """Без кэша count: лента меняется при каждой подписке и отписке."""
+    cursor_pagination_class = RecipeCursorPagination
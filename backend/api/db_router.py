@@ -0,0 +1,117 @@
+import hashlib
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_PREFIX = 'replica'
+PIN_KEY = 'db-primary-pin:{}'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Пользователи, токены и сессии всегда читаются с основной базы:
+# только что выданный токен или сменённый пароль не должны зависеть
+# от отставания реплики.
+PRIMARY_APPS = ('auth', 'authtoken', 'sessions')
+
+# Состояние маршрутизации текущего запроса. None вне запросов
+# (команды, фоновые задачи): там всё читается с основной базы.
+routing = ContextVar('db_routing', default=None)
+
+
+class RequestRouting:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES
+            if alias.startswith(REPLICA_PREFIX)]
+
+
+class ReplicaRouter:
+    """Чтение безопасных запросов к API — с реплики, остальное — с
+    основной базы.
+
+    Реплика выбирается только внутри ReplicaRoutingMiddleware и только
+    до первой записи: после неё и внутри транзакции запрос читает свои
+    же изменения с основной базы. Модели PRIMARY_APPS реплика не
+    обслуживает никогда.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = routing.get()
+        if (state is None or not state.use_replicas or state.wrote
+                or model._meta.app_label in PRIMARY_APPS
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        replicas = replica_aliases()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = routing.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def client_key(request):
+    """Ключ клиента для привязки к основной базе после записи."""
+    credentials = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    if not credentials:
+        return None
+    return PIN_KEY.format(hashlib.sha256(credentials.encode()).hexdigest())
+
+
+class ReplicaRoutingMiddleware:
+    """Включает чтение с реплик для безопасных запросов к
+    DATABASE_REPLICA_PATHS.
+
+    Клиент, который только что писал, ещё DATABASE_REPLICA_PIN_SECONDS
+    читает с основной базы: реплика может не успеть догнать её, и
+    только что созданный рецепт не нашёлся бы.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = client_key(request)
+        state = RequestRouting(
+            bool(replica_aliases())
+            and request.method in SAFE_METHODS
+            and request.path.startswith(settings.DATABASE_REPLICA_PATHS)
+            and not (key and cache.get(key))
+        )
+        token = routing.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routing.reset(token)
+        if state.wrote and key:
+            cache.set(key, True, settings.DATABASE_REPLICA_PIN_SECONDS)
+        return response
+
+
+def close_unusable_connections(**kwargs):
+    """Проверка постоянных соединений в начале запроса.
+
+    Django до 4.1 не знает CONN_HEALTH_CHECKS: соединение, которое
+    оборвала база или pgbouncer, обнаружилось бы только ошибкой
+    первого запроса. Проверяются лишь уже открытые соединения.
+    """
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict['CONN_MAX_AGE']
+                and not connection.is_usable()):
+            connection.close()
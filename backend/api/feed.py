@@ -0,0 +1,45 @@
+import logging
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from recipes.models import FeedEntry, Recipe
+
+from .image_variants import ImmediateExecutor, get_executor
+
+logger = logging.getLogger(__name__)
+
+
+def feed_queryset(user):
+    """Лента подписчика: рецепты из его записей FeedEntry, новые
+    сверху. Сортировка идёт по копии pub_date в записи ленты и
+    читается по индексу (user, -pub_date)."""
+    return Recipe.objects.with_related().filter(
+        feed_entries__user=user
+    ).order_by('-feed_entries__pub_date', '-feed_entries__recipe_id')
+
+
+def fan_out_recipe(recipe_id):
+    try:
+        recipe = Recipe.objects.filter(pk=recipe_id).only(
+            'pk', 'author_id', 'pub_date'
+        ).first()
+        if recipe is not None:
+            FeedEntry.objects.fan_out(
+                recipe, settings.FEED_FANOUT_BATCH_SIZE
+            )
+    except Exception:
+        logger.exception('Не удалось разложить рецепт %s по лентам',
+                         recipe_id)
+        raise
+    finally:
+        if not isinstance(get_executor(), ImmediateExecutor):
+            close_old_connections()
+
+
+def schedule_fan_out(recipe):
+    """Раскладывает новый рецепт по лентам в фоне после коммита."""
+    recipe_id = recipe.pk
+    transaction.on_commit(
+        lambda: get_executor().submit(fan_out_recipe, recipe_id)
+    )
@@ -1,8 +1,13 @@
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
 from django_filters.rest_framework import FilterSet, filters
 
 from ingredients.models import Ingredient
 from recipes.models import Recipe, Tag
-from users.models import User
+from users.models import Favorite, ShoppingList, User
+
+from .ingredient_index import AUTOCOMPLETE_LIMIT
+
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
 
 
 class RecipeFilter(FilterSet):
@@ -11,6 +16,7 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         queryset=Tag.objects.all(),
         to_field_name='slug',
+        method='filter_tags',
     )
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited',
@@ -20,25 +26,83 @@ class RecipeFilter(FilterSet):
         method='filter_is_in_shopping_cart',
         label='Показать рецепты в шоплисте',
     )
+    search = filters.CharFilter(
+        method='filter_search',
+        label='Поиск по названию, описанию, ингредиентам и тегам',
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='filter_ordering',
+        label='Сортировка',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    # Фильтры по связанным таблицам построены на EXISTS, а не на JOIN:
+    # рецепт не дублируется при нескольких тегах, и DISTINCT не нужен.
+
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk'), tag__in=value
+            )
+        ))
+
+    def filter_user_relation(self, queryset, model, value):
+        if not value:
+            return queryset
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        ))
 
     def filter_is_favorited(self, queryset, name, value):
-        if value:
-            return queryset.filter(favorites__user=self.request.user)
-        return queryset
+        return self.filter_user_relation(queryset, Favorite, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if value:
-            return queryset.filter(shopping_list_users__user=self.request.user)
+        return self.filter_user_relation(queryset, ShoppingList, value)
+
+    def filter_search(self, queryset, name, value):
+        """Сортирует по релевантности; ?ordering=popular, если задан,
+        применяется следом и имеет приоритет."""
+        return queryset.search(value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by(*POPULAR_ORDERING)
         return queryset
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
+
+    def filter_name(self, queryset, name, value):
+        """Сначала совпадения по началу названия, затем по вхождению.
+
+        Префиксный запрос обслуживает индекс по UPPER(name); поиск
+        подстроки — полный просмотр, и он выполняется, только если
+        совпадений по началу меньше AUTOCOMPLETE_LIMIT.
+        """
+        prefix = queryset.filter(
+            name__istartswith=value
+        ).order_by('name')[:AUTOCOMPLETE_LIMIT]
+        if len(prefix) == AUTOCOMPLETE_LIMIT:
+            return prefix
+        return queryset.filter(name__icontains=value).annotate(
+            rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('rank', 'name')[:AUTOCOMPLETE_LIMIT]
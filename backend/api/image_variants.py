@@ -0,0 +1,152 @@
+import io
+import logging
+import os
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+
+from .cache import RECIPES_VERSION, bump_version
+
+logger = logging.getLogger(__name__)
+
+IMAGE_VARIANTS = {
+    'list': (320, 320),
+    'card': (640, 640),
+    'detail': (1280, 1280),
+}
+IMAGE_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+VARIANTS_DIR = 'variants'
+
+
+class ImmediateExecutor(Executor):
+    """Выполняет задачу сразу в вызывающем потоке.
+
+    Используется в тестах и при локальной разработке.
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if settings.IMAGE_PROCESSING_EXECUTOR == 'immediate':
+                    _executor = ImmediateExecutor()
+                else:
+                    _executor = ThreadPoolExecutor(
+                        max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                        thread_name_prefix='recipe-images',
+                    )
+    return _executor
+
+
+def variant_name(name, variant, extension):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(
+        directory, VARIANTS_DIR, f'{stem}_{variant}.{extension}'
+    )
+
+
+def stripped_name(name):
+    stem, extension = os.path.splitext(name)
+    return f'{stem}_stripped{extension}'
+
+
+def save_image(image, name, image_format, options):
+    """Сохраняет картинку, не перезаписывая существующие файлы.
+
+    Возвращает имя, которое выбрало хранилище.
+    """
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(name):
+    """Сохраняет оригинал без метаданных под новым именем и уменьшенные
+    копии.
+
+    Исходный файл не трогается: пока рецепт ссылается на него, URL
+    картинки должен открываться. Возвращает имя нового оригинала и
+    {вариант: {формат: имя файла в хранилище}}.
+    """
+    with default_storage.open(name) as file:
+        source = Image.open(file)
+        source_format = source.format
+        source = ImageOps.exif_transpose(source)
+        source.load()
+    # Пересохранение без параметра exif отбрасывает метаданные.
+    image = save_image(
+        source, stripped_name(name), source_format, {'quality': 95}
+    )
+    rgb = source.convert('RGB')
+    variants = {}
+    for variant, size in IMAGE_VARIANTS.items():
+        thumbnail = rgb.copy()
+        thumbnail.thumbnail(size, Image.LANCZOS)
+        variants[variant] = {
+            image_format: save_image(
+                thumbnail, variant_name(image, variant, extension),
+                pil_format, options
+            )
+            for image_format, (pil_format, extension, options)
+            in IMAGE_FORMATS.items()
+        }
+    return image, variants
+
+
+def process_recipe_image(recipe_id, name):
+    """Подменяет картинку рецепта обработанной, если она не сменилась.
+
+    Старый файл удаляется после обновления записи. Если картинку
+    успели заменить или рецепт удалили, удаляются новые файлы.
+    """
+    try:
+        image, variants = build_variants(name)
+        if Recipe.objects.filter(pk=recipe_id, image=name).update(
+                image=image, image_variants=variants):
+            bump_version(RECIPES_VERSION)
+            default_storage.delete(name)
+        else:
+            for stale in [image] + [
+                variant_file for formats in variants.values()
+                for variant_file in formats.values()
+            ]:
+                default_storage.delete(stale)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', name)
+        raise
+    finally:
+        if not isinstance(get_executor(), ImmediateExecutor):
+            close_old_connections()
+
+
+def schedule_image_processing(recipe):
+    """Отправляет картинку рецепта в пул после коммита транзакции."""
+    recipe_id, name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: get_executor().submit(process_recipe_image, recipe_id, name)
+    )
@@ -0,0 +1,77 @@
+import threading
+from bisect import bisect_left, bisect_right
+
+from django.conf import settings
+
+from ingredients.models import Ingredient
+
+from .cache import get_version
+
+INGREDIENTS_VERSION = 'ingredients'
+AUTOCOMPLETE_LIMIT = getattr(settings, 'INGREDIENT_AUTOCOMPLETE_LIMIT', 50)
+
+
+class IngredientIndex:
+    """Отсортированный по названию в нижнем регистре список ингредиентов.
+
+    Префиксные совпадения ищутся бинарным поиском, вхождения
+    подстроки добавляются после них. Индекс перестраивается,
+    когда меняется версия ингредиентов в общем кэше.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.entries = ([], [], '', [])
+        self.lock = threading.Lock()
+
+    def build(self, rows):
+        entries = sorted(
+            (name.lower(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        keys = [entry[0] for entry in entries]
+        offsets = []
+        position = 0
+        for key in keys:
+            offsets.append(position)
+            position += len(key) + 1
+        self.entries = (
+            keys,
+            [{'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+             for _, pk, name, measurement_unit in entries],
+            '\n'.join(keys),
+            offsets,
+        )
+
+    def refresh(self):
+        version = get_version(INGREDIENTS_VERSION)
+        if version == self.version:
+            return
+        with self.lock:
+            if version != self.version:
+                self.build(Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                ))
+                self.version = version
+
+    def search(self, query, limit=AUTOCOMPLETE_LIMIT):
+        query = query.lower().replace('\n', ' ')
+        keys, rows, text, offsets = self.entries
+        start = bisect_left(keys, query)
+        end = start
+        while (end < len(keys) and end - start < limit
+               and keys[end].startswith(query)):
+            end += 1
+        result = rows[start:end]
+        position = text.find(query)
+        while position != -1 and len(result) < limit:
+            line = bisect_right(offsets, position) - 1
+            if offsets[line] != position:
+                result.append(rows[line])
+            if line + 1 == len(offsets):
+                break
+            position = text.find(query, offsets[line + 1])
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,34 @@
+"""Общее для команд-бенчмарков: --output, JSON-отчёт и перцентили."""
+import json
+import statistics
+
+from django.core.management.base import BaseCommand
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_stats(latencies, digits=2):
+    """p50 и p99 замеров в миллисекундах."""
+    return {
+        'p50_ms': round(statistics.median(latencies), digits),
+        'p99_ms': round(percentile(latencies, 0.99), digits),
+    }
+
+
+class BenchmarkCommand(BaseCommand):
+    """Бенчмарк с отчётом в JSON: в файл --output или одной строкой
+    в stdout после построчных результатов."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Write JSON results to a file')
+
+    def write_report(self, report, output):
+        if output:
+            with open(output, 'w', encoding='utf8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
@@ -0,0 +1,315 @@
+import platform
+import statistics
+import subprocess
+import time
+from unittest import mock
+
+from django.core.files.storage import default_storage
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.throttling import SimpleRateThrottle
+
+from api.custom_pagination import CustomPagination
+from api.image_variants import get_executor
+from api.management.benchmarking import BenchmarkCommand, latency_stats
+from ingredients.models import Ingredient
+from recipes.models import Recipe, Tag
+from users.models import Follow, User
+
+PAGE_SIZE = CustomPagination.page_size
+BATCH_SIZE = 10
+BENCHMARK_IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+class Command(BenchmarkCommand):
+    help = ('Measure latency, query count and throughput of the API routes '
+            'against the configured database. /api/auth/ token login and '
+            'logout, user registration and set_password are not measured: '
+            'they change the credentials of the benchmark user')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Requests per route')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--route', action='append', dest='routes',
+                            help='Only run the named route (repeatable)')
+
+    def handle(self, *args, **options):
+        user = Follow.objects.values('user').annotate(
+            follows=Count('pk')
+        ).order_by('-follows').values_list('user', flat=True).first()
+        if user is None:
+            raise CommandError(
+                'Нет данных: сначала выполните seed_synthetic_data'
+            )
+        self.user = User.objects.get(pk=user)
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.anonymous = Client()
+        self.created = []
+
+        routes = self.get_routes(options['requests'] + options['warmup'])
+        if options['routes']:
+            routes = {name: routes[name] for name in options['routes']}
+        results = []
+        # Замеряется обработка запроса, а не ответы 429: ставки
+        # throttling на время прогона отключены.
+        rates = SimpleRateThrottle.THROTTLE_RATES
+        try:
+            with mock.patch.dict(rates, dict.fromkeys(rates)):
+                for name, request in routes.items():
+                    results.append(self.measure(
+                        name, request, options['requests'],
+                        options['warmup'],
+                    ))
+                    self.stdout.write(self.format_result(results[-1]))
+        finally:
+            self.remove_created_recipes()
+
+        report = {
+            'commit': self.commit(),
+            'timestamp': int(time.time()),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'recipes': Recipe.objects.count(),
+            'users': User.objects.count(),
+            'routes': results,
+        }
+        self.write_report(report, options['output'])
+        failed = [result['route'] for result in results
+                  if any(not 200 <= code < 300
+                         for code in result['statuses'])]
+        if failed:
+            raise CommandError(f'Ответы не 2xx: {", ".join(failed)}')
+
+    def remove_created_recipes(self):
+        get_executor().shutdown(wait=True)
+        recipes = Recipe.objects.filter(pk__in=self.created)
+        for image, variants in recipes.values_list('image', 'image_variants'):
+            names = [image] + [
+                name for formats in variants.values()
+                for name in formats.values()
+            ]
+            for name in names:
+                default_storage.delete(name)
+        recipes.delete()
+
+    def get_routes(self, requests):
+        """Маршруты api/urls.py. Не замеряются /api/auth/ (вход и
+        выход), регистрация и set_password: они меняют учётные данные
+        пользователя, от имени которого идёт прогон."""
+        client, anonymous = self.client, self.anonymous
+        recipe = Recipe.objects.first()
+        author = recipe.author_id
+        tags = list(Tag.objects.values_list('slug', flat=True)[:16])
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True)[:5])
+        recipe_payload = {
+            'ingredients': [{'id': pk, 'amount': 10} for pk in ingredients],
+            'tags': list(Tag.objects.values_list('pk', flat=True)[:1]),
+            'image': BENCHMARK_IMAGE,
+            'name': 'Бенчмарк',
+            'text': 'Рецепт для бенчмарка',
+            'cooking_time': 10,
+        }
+        update_payload = {
+            key: value for key, value in recipe_payload.items()
+            if key != 'image'
+        }
+        # Середина списка: глубокая страница, которая есть на любом
+        # наборе данных.
+        deep_page = max(1, Recipe.objects.count() // PAGE_SIZE // 2)
+        outside = {
+            relation: list(Recipe.objects.exclude(**{
+                f'{relation}__user': self.user
+            }).values_list('pk', flat=True)[:BATCH_SIZE])
+            for relation in ('favorites', 'shopping_list_users')
+        }
+        unfollowed = User.objects.exclude(pk=self.user.pk).exclude(
+            following__user=self.user
+        ).values_list('pk', flat=True).first()
+        pool = []
+        own = []
+
+        def create_recipe():
+            response = client.post('/api/recipes/', recipe_payload,
+                                   content_type='application/json')
+            if response.status_code == 201:
+                self.created.append(
+                    Recipe.objects.filter(author=self.user).values_list(
+                        'pk', flat=True
+                    ).order_by('-pk').first()
+                )
+            return response
+
+        def update_recipe():
+            if not own:
+                own.extend(self.create_recipes(1))
+            return client.patch(f'/api/recipes/{own[0]}/', update_payload,
+                                content_type='application/json')
+
+        def delete_recipe():
+            # Рецепты для удаления создаются до первого замера,
+            # по одному на каждый запрос прогона.
+            if not pool:
+                pool.extend(self.create_recipes(requests))
+            return client.delete(f'/api/recipes/{pool.pop()}/')
+
+        return {
+            'recipes_list': lambda: client.get('/api/recipes/'),
+            'recipes_list_anonymous': lambda: anonymous.get('/api/recipes/'),
+            'recipes_list_deep_page': lambda: client.get(
+                f'/api/recipes/?page={deep_page}'
+            ),
+            **{
+                f'recipes_list_tags_{count}': self.tag_request(tags[:count])
+                for count in (1, 2, 4, 8, 16) if count <= len(tags)
+            },
+            'recipes_list_tags_favorited': lambda: client.get(
+                '/api/recipes/?is_favorited=1&'
+                + '&'.join(f'tags={slug}' for slug in tags[:4])
+                + f'&author={author}'
+            ),
+            'recipes_list_author': lambda: client.get(
+                f'/api/recipes/?author={author}'
+            ),
+            'recipes_list_favorited': lambda: client.get(
+                '/api/recipes/?is_favorited=1'
+            ),
+            'recipes_list_in_cart': lambda: client.get(
+                '/api/recipes/?is_in_shopping_cart=1'
+            ),
+            'recipes_list_popular': lambda: client.get(
+                '/api/recipes/?ordering=popular'
+            ),
+            'recipes_search': lambda: client.get(
+                '/api/recipes/?search=сахар'
+            ),
+            'recipes_feed': lambda: client.get('/api/recipes/feed/'),
+            'recipe_detail': lambda: client.get(f'/api/recipes/{recipe.pk}/'),
+            'recipe_create': create_recipe,
+            'recipe_update': update_recipe,
+            'recipe_delete': delete_recipe,
+            'recipe_favorite_toggle': self.toggle(
+                f'/api/recipes/{outside["favorites"][0]}/favorite/'
+            ),
+            'recipe_shopping_cart_toggle': self.toggle(
+                f'/api/recipes/{outside["shopping_list_users"][0]}'
+                '/shopping_cart/'
+            ),
+            'recipes_favorite_batch_toggle': self.toggle(
+                '/api/recipes/favorite/',
+                {'recipes': outside['favorites']},
+            ),
+            'recipes_shopping_cart_batch_toggle': self.toggle(
+                '/api/recipes/shopping_cart/',
+                {'recipes': outside['shopping_list_users']},
+            ),
+            'subscribe_toggle': self.toggle(
+                f'/api/users/{unfollowed}/subscribe/'
+            ),
+            'subscriptions': lambda: client.get(
+                '/api/users/subscriptions/?recipes_limit=3'
+            ),
+            'download_shopping_cart': lambda: client.get(
+                '/api/recipes/download_shopping_cart/'
+            ),
+            'tags': lambda: client.get('/api/tags/'),
+            'tag_detail': lambda: client.get(
+                f'/api/tags/{recipe_payload["tags"][0]}/'
+            ),
+            'ingredients': lambda: client.get('/api/ingredients/'),
+            'ingredients_search': lambda: client.get(
+                '/api/ingredients/?name=сах'
+            ),
+            'ingredient_detail': lambda: client.get(
+                f'/api/ingredients/{ingredients[0]}/'
+            ),
+            'users_list': lambda: client.get('/api/users/'),
+            'user_detail': lambda: client.get(f'/api/users/{author}/'),
+            'users_me': lambda: client.get('/api/users/me/'),
+        }
+
+    def toggle(self, url, payload=None):
+        """POST и следом DELETE того же адреса; ответ — DELETE, если
+        добавление удалось, иначе ответ POST."""
+        def request():
+            response = self.client.post(
+                url, payload, content_type='application/json'
+            )
+            if response.status_code not in (200, 201):
+                return response
+            return self.client.delete(
+                url, payload, content_type='application/json'
+            )
+        return request
+
+    def create_recipes(self, count):
+        """Рецепты пользователя прогона без картинки на диске; их
+        удаляет remove_created_recipes."""
+        ids = [
+            Recipe.objects.create(
+                author=self.user, name='Бенчмарк', text='',
+                image='media/recipes/images/benchmark.png', cooking_time=1,
+            ).pk
+            for _ in range(count)
+        ]
+        self.created.extend(ids)
+        return ids
+
+    def tag_request(self, slugs):
+        query = '&'.join(f'tags={slug}' for slug in slugs)
+        return lambda: self.client.get(f'/api/recipes/?{query}')
+
+    @staticmethod
+    def measure(name, request, count, warmup):
+        for _ in range(warmup):
+            request()
+        latencies, queries, statuses = [], [], set()
+        started = time.perf_counter()
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = request()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context.captured_queries))
+            statuses.add(response.status_code)
+        elapsed = time.perf_counter() - started
+        return {
+            'route': name,
+            'requests': count,
+            'statuses': sorted(statuses),
+            **latency_stats(latencies),
+            'max_ms': round(max(latencies), 2),
+            'queries': round(statistics.mean(queries), 1),
+            'throughput_rps': round(count / elapsed, 1),
+        }
+
+    @staticmethod
+    def format_result(result):
+        return (
+            f"{result['route']:<36} p50 {result['p50_ms']:>8.2f} ms  "
+            f"p99 {result['p99_ms']:>8.2f} ms  "
+            f"{result['queries']:>5} queries  "
+            f"{result['throughput_rps']:>7.1f} req/s  "
+            f"{result['statuses']}"
+        )
+
+    @staticmethod
+    def commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,98 @@
+import statistics
+import time
+from unittest import mock
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.views import APIView
+
+from api.authentication import CachingTokenAuthentication, token_lru
+from api.management.benchmarking import BenchmarkCommand, latency_stats
+from users.models import User
+
+ROUTES = ('/api/users/me/', '/api/recipes/')
+
+
+class Command(BenchmarkCommand):
+    help = ('Measure per-request token authentication overhead with '
+            'TokenAuthentication and CachingTokenAuthentication')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--route', action='append', dest='routes',
+                            help='Full-request route (repeatable)')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_active=True).first()
+        if user is None:
+            raise CommandError(
+                'Нет данных: сначала выполните seed_synthetic_data'
+            )
+        key = Token.objects.get_or_create(user=user)[0].key
+        header = f'Token {key}'
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=header)
+        count = options['requests']
+
+        def authenticate(authentication, clear=False):
+            def run():
+                if clear:
+                    token_lru.clear()
+                authentication.authenticate(request)
+            return run
+
+        caching = CachingTokenAuthentication()
+        authenticate(caching)()
+        results = [
+            self.measure('authenticate_db',
+                         authenticate(TokenAuthentication()), count),
+            self.measure('authenticate_shared_cache',
+                         authenticate(caching, clear=True), count),
+            self.measure('authenticate_local_lru',
+                         authenticate(caching), count),
+        ]
+        client = Client(HTTP_AUTHORIZATION=header)
+        for route in options['routes'] or ROUTES:
+            for name, authentication in (
+                ('db', TokenAuthentication),
+                ('cached', CachingTokenAuthentication),
+            ):
+                with mock.patch.object(APIView, 'authentication_classes',
+                                       [authentication]):
+                    results.append(self.measure(
+                        f'{route} {name}', lambda: client.get(route), count
+                    ))
+        for result in results:
+            self.stdout.write(self.format_result(result))
+
+        report = {'database': connection.vendor, 'results': results}
+        self.write_report(report, options['output'])
+
+    @staticmethod
+    def measure(name, run, count):
+        run()
+        latencies, queries = [], []
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                run()
+                latencies.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context.captured_queries))
+        return {
+            'name': name,
+            'requests': count,
+            **latency_stats(latencies, digits=3),
+            'queries': round(statistics.mean(queries), 1),
+        }
+
+    @staticmethod
+    def format_result(result):
+        return (
+            f"{result['name']:<30} p50 {result['p50_ms']:>8.3f} ms  "
+            f"p99 {result['p99_ms']:>8.3f} ms  "
+            f"{result['queries']:>5} queries"
+        )
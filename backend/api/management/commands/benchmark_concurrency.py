@@ -0,0 +1,221 @@
+import asyncio
+import queue
+import random
+import tempfile
+import threading
+import time
+
+from django.core.management.base import CommandError
+from django.db import close_old_connections, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.management.benchmarking import BenchmarkCommand, latency_stats
+from recipes.models import Recipe
+from users.models import User
+
+FAST_URLS = (
+    '/api/recipes/',
+    '/api/recipes/{recipe}/',
+    '/api/tags/',
+    '/api/ingredients/?name=са',
+    '/api/users/subscriptions/?recipes_limit=3',
+)
+SLOW_URL = '/api/recipes/download_shopping_cart/?format=pdf'
+URLCONFS = {'sync': 'foodgram.urls', 'asgi': 'foodgram.asgi_urls'}
+LATENCY_UID = 'benchmark_concurrency_latency'
+
+
+class Command(BenchmarkCommand):
+    help = ('Compare sync-worker and ASGI throughput under a mix of slow '
+            '(PDF export) and fast (read) requests. Sync workers are '
+            'modelled as threads that serve one request at a time')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument('--slow-ratio', type=float, default=0.1,
+                            help='Share of PDF exports in the request mix')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Sync workers')
+        parser.add_argument('--concurrency', type=int, default=32,
+                            help='Requests in flight against ASGI')
+        parser.add_argument('--db-latency', type=float, default=0.0,
+                            help='Extra round-trip added to every query, ms')
+        parser.add_argument('--fast-url', action='append', dest='fast_urls',
+                            help='Fast route (repeatable)')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        plan = self.build_plan(options)
+        delay = None
+        if options['db_latency']:
+            delay = self.add_db_latency(options['db_latency'] / 1000)
+        results = {}
+        try:
+            for mode, run in (('sync', self.run_sync),
+                              ('asgi', self.run_asgi)):
+                # Каталог кэша выгрузок свой на каждый прогон, поэтому
+                # каждый PDF действительно рендерится.
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    with override_settings(SHOPPING_LIST_CACHE_DIR=cache_dir,
+                                           ROOT_URLCONF=URLCONFS[mode]):
+                        results[mode] = self.summarize(
+                            *run(plan, options)
+                        )
+                self.stdout.write(self.format_result(mode, results[mode]))
+        finally:
+            connection_created.disconnect(dispatch_uid=LATENCY_UID)
+            if delay in connection.execute_wrappers:
+                connection.execute_wrappers.remove(delay)
+
+        report = {
+            'database': connection.vendor,
+            'requests': len(plan),
+            'slow_requests': sum(kind == 'slow' for kind, _, _ in plan),
+            'workers': options['workers'],
+            'concurrency': options['concurrency'],
+            'db_latency_ms': options['db_latency'],
+            'modes': results,
+        }
+        self.write_report(report, options['output'])
+
+    def build_plan(self, options):
+        slow_count = round(options['requests'] * options['slow_ratio'])
+        cart_users = list(User.objects.filter(
+            shopping_cart_ingredients__isnull=False
+        ).distinct().values_list('pk', flat=True)[:slow_count])
+        reader = User.objects.filter(
+            follower__isnull=False
+        ).values_list('pk', flat=True).first()
+        recipe = Recipe.objects.values_list('pk', flat=True).first()
+        if reader is None or recipe is None or len(cart_users) < slow_count:
+            raise CommandError(
+                'Нет данных: сначала выполните seed_synthetic_data'
+            )
+        tokens = {
+            pk: Token.objects.get_or_create(user_id=pk)[0].key
+            for pk in (reader, *cart_users)
+        }
+        fast_urls = [
+            url.format(recipe=recipe)
+            for url in options['fast_urls'] or FAST_URLS
+        ]
+        # Каждый PDF выгружает другой пользователь: кэш выгрузок
+        # не срабатывает, медленные запросы остаются медленными.
+        plan = [('slow', SLOW_URL, tokens[pk]) for pk in cart_users]
+        plan += [
+            ('fast', fast_urls[number % len(fast_urls)], tokens[reader])
+            for number in range(options['requests'] - slow_count)
+        ]
+        random.Random(options['seed']).shuffle(plan)
+        return plan
+
+    @staticmethod
+    def add_db_latency(seconds):
+        def delay(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            # Обёртка живёт на DatabaseWrapper потока, а он переживает
+            # переподключения.
+            if delay not in connection.execute_wrappers:
+                connection.execute_wrappers.append(delay)
+
+        connection_created.connect(install, weak=False,
+                                   dispatch_uid=LATENCY_UID)
+        connection.execute_wrappers.append(delay)
+        return delay
+
+    @staticmethod
+    def fetch(response):
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    def run_sync(self, plan, options):
+        jobs = queue.SimpleQueue()
+        for job in plan:
+            jobs.put(job)
+        samples = []
+
+        def worker():
+            client = Client()
+            try:
+                while True:
+                    try:
+                        kind, url, token = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    start = time.perf_counter()
+                    status = self.fetch(client.get(
+                        url, HTTP_AUTHORIZATION=f'Token {token}'
+                    ))
+                    samples.append(
+                        (kind, (time.perf_counter() - start) * 1000, status)
+                    )
+                    # Тестовый клиент не закрывает соединение по
+                    # request_finished, как это делает настоящий воркер.
+                    close_old_connections()
+            finally:
+                connections.close_all()
+
+        workers = [
+            threading.Thread(target=worker)
+            for _ in range(options['workers'])
+        ]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return samples, time.perf_counter() - started
+
+    def run_asgi(self, plan, options):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            samples = []
+
+            async def request(kind, url, token):
+                async with semaphore:
+                    start = time.perf_counter()
+                    status = self.fetch(await client.get(
+                        url, authorization=f'Token {token}'
+                    ))
+                    samples.append(
+                        (kind, (time.perf_counter() - start) * 1000, status)
+                    )
+
+            started = time.perf_counter()
+            await asyncio.gather(*(request(*job) for job in plan))
+            return samples, time.perf_counter() - started
+
+        return asyncio.run(run())
+
+    @staticmethod
+    def summarize(samples, elapsed):
+        result = {
+            'elapsed_s': round(elapsed, 2),
+            'throughput_rps': round(len(samples) / elapsed, 1),
+            'statuses': sorted({status for _, _, status in samples}),
+        }
+        for kind in ('fast', 'slow'):
+            latencies = [ms for name, ms, _ in samples if name == kind]
+            if latencies:
+                result[kind] = {
+                    'requests': len(latencies),
+                    **latency_stats(latencies),
+                }
+        return result
+
+    @staticmethod
+    def format_result(mode, result):
+        line = f"{mode:<5} {result['throughput_rps']:>7.1f} req/s"
+        for kind in ('fast', 'slow'):
+            if kind in result:
+                line += (f"  {kind} p50 {result[kind]['p50_ms']:>8.2f} ms"
+                         f" p99 {result[kind]['p99_ms']:>8.2f} ms")
+        return f"{line}  {result['statuses']}"
@@ -0,0 +1,177 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from api.feed import feed_queryset
+from api.management.benchmarking import BenchmarkCommand, percentile
+from recipes.models import FeedEntry, Recipe
+from users.models import Follow, User
+
+PAGE_SIZE = 6
+DEEP_PAGE = 20
+
+
+def pull_queryset(user):
+    """Лента без таблицы FeedEntry: join подписок с рецептами."""
+    return Recipe.objects.with_related().filter(
+        author__following__user=user
+    ).order_by('-pub_date', '-id')
+
+
+class Command(BenchmarkCommand):
+    help = ('Compare fan-out-on-write (FeedEntry) with fan-out-on-read '
+            '(Follow joined to Recipe) for the subscription feed. Works on '
+            'synthetic users inside a transaction that is rolled back')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--followers', type=int, action='append',
+                            help='Followers of the publishing author '
+                                 '(repeatable), write side')
+        parser.add_argument('--following', type=int, action='append',
+                            help='Authors followed by the reader '
+                                 '(repeatable), read side')
+        parser.add_argument('--recipes-per-author', type=int, default=30)
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.FEED_FANOUT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        followers = sorted(options['followers'] or (10, 100, 1000, 10000))
+        following = sorted(options['following'] or (10, 50, 200))
+        with transaction.atomic():
+            # users[0] публикует рецепты на стороне записи и читает
+            # ленту на стороне чтения.
+            users = self.create_users(
+                max(max(followers), max(following)) + 1
+            )
+            write = [
+                self.isolated(self.measure_write, users[0],
+                              users[1:count + 1], options)
+                for count in followers
+            ]
+            for result in write:
+                self.stdout.write(self.format_write(result))
+            read = [
+                self.isolated(self.measure_read, users[0],
+                              users[1:count + 1], options)
+                for count in following
+            ]
+            for result in read:
+                self.stdout.write(self.format_read(result))
+            transaction.set_rollback(True)
+
+        report = {
+            'database': connection.vendor,
+            'batch_size': options['batch_size'],
+            'recipes_per_author': options['recipes_per_author'],
+            'write': write,
+            'read': read,
+        }
+        self.write_report(report, options['output'])
+
+    @staticmethod
+    def isolated(measure, *args):
+        """Каждый замер в своей точке сохранения, откатываемой после."""
+        with transaction.atomic():
+            result = measure(*args)
+            transaction.set_rollback(True)
+        return result
+
+    @staticmethod
+    def create_users(count):
+        prefix = f'feed_bench_{int(time.time())}'
+        User.objects.bulk_create(
+            (User(username=f'{prefix}_{number}',
+                  email=f'{prefix}_{number}@example.com',
+                  first_name='Бенчмарк', last_name='Ленты', password='!')
+             for number in range(count)),
+            batch_size=1000,
+        )
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('pk'))
+
+    @staticmethod
+    def create_recipes(authors, count):
+        Recipe.objects.bulk_create(
+            (Recipe(author=author, name=f'Рецепт {number}', text='',
+                    image='bench.png', cooking_time=1)
+             for author in authors for number in range(count)),
+            batch_size=1000,
+        )
+
+    def measure_write(self, author, followers, options):
+        """Публикация рецепта: вставка рецепта плюс раскладка по
+        лентам против одной вставки при сборке ленты на чтении."""
+        Follow.objects.bulk_create(
+            (Follow(user=user, author=author) for user in followers),
+            batch_size=1000,
+        )
+        insert, total = [], []
+        for _ in range(options['requests']):
+            start = time.perf_counter()
+            recipe = Recipe.objects.create(
+                author=author, name='Бенчмарк', text='',
+                image='bench.png', cooking_time=1,
+            )
+            inserted = time.perf_counter()
+            FeedEntry.objects.fan_out(recipe, options['batch_size'])
+            insert.append((inserted - start) * 1000)
+            total.append((time.perf_counter() - start) * 1000)
+        return {
+            'followers': len(followers),
+            'pull_p50_ms': round(statistics.median(insert), 2),
+            'push_p50_ms': round(statistics.median(total), 2),
+            'push_p99_ms': round(percentile(total, 0.99), 2),
+            'rows_written': len(followers) + 1,
+        }
+
+    def measure_read(self, reader, authors, options):
+        """Первая и глубокая страница ленты читателя, подписанного на
+        authors авторов с recipes_per_author рецептами у каждого."""
+        self.create_recipes(authors, options['recipes_per_author'])
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=author) for author in authors
+        )
+        FeedEntry.objects.rebuild(user_ids=[reader.pk])
+        result = {'following': len(authors)}
+        for mode, queryset in (('push', feed_queryset(reader)),
+                               ('pull', pull_queryset(reader))):
+            for page, offset in (('first', 0),
+                                 ('deep', PAGE_SIZE * (DEEP_PAGE - 1))):
+                result[f'{mode}_{page}_p50_ms'], plan = self.measure_query(
+                    queryset[offset:offset + PAGE_SIZE], options['requests']
+                )
+            result[f'{mode}_plan'] = plan
+        return result
+
+    @staticmethod
+    def measure_query(queryset, count):
+        latencies = []
+        for _ in range(count):
+            start = time.perf_counter()
+            list(queryset.all())
+            latencies.append((time.perf_counter() - start) * 1000)
+        return round(statistics.median(latencies), 2), queryset.explain()
+
+    @staticmethod
+    def format_write(result):
+        return (
+            f"write followers {result['followers']:>6}  "
+            f"pull {result['pull_p50_ms']:>8.2f} ms  "
+            f"push p50 {result['push_p50_ms']:>8.2f} ms  "
+            f"p99 {result['push_p99_ms']:>8.2f} ms"
+        )
+
+    @staticmethod
+    def format_read(result):
+        return (
+            f"read following {result['following']:>5}  "
+            f"push {result['push_first_p50_ms']:>7.2f}/"
+            f"{result['push_deep_p50_ms']:>7.2f} ms  "
+            f"pull {result['pull_first_p50_ms']:>7.2f}/"
+            f"{result['pull_deep_p50_ms']:>7.2f} ms (first/deep page)"
+        )
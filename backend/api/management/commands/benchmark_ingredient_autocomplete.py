@@ -0,0 +1,78 @@
+import csv
+import os
+import time
+
+from api.filters import IngredientFilter
+from api.ingredient_index import IngredientIndex
+from api.management.benchmarking import BenchmarkCommand
+from ingredients.models import Ingredient
+
+from .import_ingredients import DATA_ROOT
+
+QUERIES = ('а', 'мо', 'сах', 'кур', 'я', 'ов', 'соль', 'xyz')
+
+
+class Command(BenchmarkCommand):
+    help = ('Compare ingredient autocomplete index with a linear scan and '
+            'the database fallback (IngredientFilter)')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('filename', default='ingredients.csv', nargs='?')
+        parser.add_argument('--repeat', type=int, default=1000)
+        parser.add_argument('--db-repeat', type=int, default=50,
+                            help='Repeats of the database fallback; '
+                                 'skipped when the table is empty')
+
+    def handle(self, *args, **options):
+        with open(os.path.join(DATA_ROOT, options['filename']),
+                  newline='', encoding='utf8') as csv_file:
+            rows = [
+                (pk, name, unit)
+                for pk, (name, unit) in enumerate(csv.reader(csv_file), 1)
+            ]
+        index = IngredientIndex()
+        index.build(rows)
+        repeat = options['repeat']
+        database = Ingredient.objects.exists()
+        results = []
+        for query in QUERIES:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                found = index.search(query)
+            indexed = (time.perf_counter() - start) / repeat
+            start = time.perf_counter()
+            for _ in range(repeat):
+                [row for row in rows if row[1].lower().startswith(query)]
+            scan = (time.perf_counter() - start) / repeat
+            result = {
+                'query': query,
+                'results': len(found),
+                'index_us': round(indexed * 1e6, 1),
+                'linear_scan_us': round(scan * 1e6, 1),
+            }
+            line = (
+                f'{query!r}: {len(found)} results, '
+                f'index {indexed * 1e6:.1f} us, '
+                f'linear prefix scan {scan * 1e6:.1f} us'
+            )
+            if database:
+                fallback = self.measure_database(query, options['db_repeat'])
+                result['db_fallback_us'] = round(fallback * 1e6, 1)
+                line += f', db fallback {fallback * 1e6:.1f} us'
+            results.append(result)
+            self.stdout.write(line)
+        self.write_report({
+            'ingredients': len(rows),
+            'repeat': repeat,
+            'results': results,
+        }, options['output'])
+
+    @staticmethod
+    def measure_database(query, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            list(IngredientFilter(
+                {'name': query}, queryset=Ingredient.objects.all()
+            ).qs)
+        return (time.perf_counter() - start) / repeat
@@ -0,0 +1,52 @@
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from api.create_pdf_A4 import create_pdf
+from api.management.benchmarking import BenchmarkCommand, latency_stats
+
+
+class Command(BenchmarkCommand):
+    help = 'Measure shopping list PDF rendering latency and peak memory'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('sizes', nargs='*', type=int,
+                            default=[10, 100, 1000])
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        results = []
+        for size in options['sizes']:
+            ingredients = [
+                SimpleNamespace(
+                    name=f'ингредиент {number}',
+                    measurement_unit='г',
+                    amount=number,
+                )
+                for number in range(size)
+            ]
+            timings = []
+            peak = 0
+            for _ in range(options['repeat']):
+                tracemalloc.start()
+                start = time.perf_counter()
+                create_pdf('Список покупок', ingredients).close()
+                timings.append((time.perf_counter() - start) * 1000)
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            results.append({
+                'ingredients': size,
+                'repeat': len(timings),
+                'min_ms': round(min(timings), 1),
+                'max_ms': round(max(timings), 1),
+                **latency_stats(timings, digits=1),
+                'peak_memory_kib': round(peak / 1024),
+            })
+            self.stdout.write(
+                f'{size} ingredients: '
+                f'min {min(timings):.1f} ms, '
+                f'max {max(timings):.1f} ms, '
+                f'peak memory {peak / 1024:.0f} KiB'
+            )
+        self.write_report({'results': results}, options['output'])
@@ -0,0 +1,89 @@
+import time
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from rest_framework.throttling import ScopedRateThrottle
+
+from api.management.benchmarking import BenchmarkCommand, latency_stats
+from api.throttling import ScopedTokenBucketThrottle
+
+BUDGET_MS = 1.0
+
+
+class Command(BenchmarkCommand):
+    help = ('Measure the bookkeeping cost of the favorite/cart/subscribe '
+            'throttles against the configured cache')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--requests', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=200,
+                            help='Distinct clients (cache keys)')
+
+    def handle(self, *args, **options):
+        requests = [
+            SimpleNamespace(user=SimpleNamespace(
+                pk=number, is_authenticated=True
+            ), META={})
+            for number in range(options['users'])
+        ]
+        results = []
+        for name, throttle_class, rate in (
+            ('token_bucket_allowed', ScopedTokenBucketThrottle, '1000000/s'),
+            ('token_bucket_denied', ScopedTokenBucketThrottle, '1/day'),
+            ('drf_scoped_allowed', ScopedRateThrottle, '1000000/s'),
+            ('drf_scoped_denied', ScopedRateThrottle, '1/day'),
+        ):
+            # Своя область на каждый прогон, чтобы история одного
+            # не влияла на другой.
+            view = SimpleNamespace(throttle_scope=f'benchmark_{name}')
+            throttle_class.THROTTLE_RATES = {view.throttle_scope: rate}
+            try:
+                results.append(self.measure(
+                    name, throttle_class, requests, view,
+                    options['requests'],
+                ))
+            finally:
+                del throttle_class.THROTTLE_RATES
+                throttle = throttle_class()
+                throttle.scope = view.throttle_scope
+                cache.delete_many([
+                    throttle.get_cache_key(request, view)
+                    for request in requests
+                ])
+            self.stdout.write(self.format_result(results[-1]))
+
+        over = [result['name'] for result in results
+                if result['name'].startswith('token_bucket')
+                and result['p99_ms'] >= BUDGET_MS]
+        if over:
+            self.stderr.write(f'Больше {BUDGET_MS} мс на запрос: {over}')
+        report = {
+            'cache': cache.__class__.__name__,
+            'budget_ms': BUDGET_MS,
+            'results': results,
+        }
+        self.write_report(report, options['output'])
+
+    @staticmethod
+    def measure(name, throttle_class, requests, view, count):
+        latencies, allowed = [], 0
+        for number in range(count):
+            request = requests[number % len(requests)]
+            start = time.perf_counter()
+            allowed += throttle_class().allow_request(request, view)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return {
+            'name': name,
+            'requests': count,
+            'allowed': allowed,
+            **latency_stats(latencies, digits=4),
+        }
+
+    @staticmethod
+    def format_result(result):
+        return (
+            f"{result['name']:<22} p50 {result['p50_ms']:>7.4f} ms  "
+            f"p99 {result['p99_ms']:>7.4f} ms  "
+            f"allowed {result['allowed']}/{result['requests']}"
+        )
@@ -1,10 +1,16 @@
 import csv
+import json
 import logging
 import os
+import time
+from itertools import islice
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
+from api.cache import bump_version
+from api.ingredient_index import INGREDIENTS_VERSION
 from ingredients.models import Ingredient
 
 logging.basicConfig(
@@ -15,29 +21,71 @@ logging.basicConfig(
 )
 
 DATA_ROOT = os.path.join(settings.BASE_DIR, 'data')
+CHUNK_SIZE = 500
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if row:
+            name, measurement_unit = row
+            yield name, measurement_unit
+
+
+def read_json(file):
+    # json.load разбирает файл целиком: в отличие от CSV, память
+    # растёт с размером файла.
+    for item in json.load(file):
+        yield item['name'], item['measurement_unit']
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
 
 
 class Command(BaseCommand):
-    help = 'Load data from csv file into the database'
+    help = ('Load data from csv or json file into the database. CSV is '
+            'streamed row by row; JSON is loaded into memory whole, so '
+            'use CSV for large files')
 
     def add_arguments(self, parser):
         parser.add_argument('filename', default='ingredients.csv', nargs='?',
                             type=str)
+        parser.add_argument('--chunk-size', default=CHUNK_SIZE, type=int)
 
     def handle(self, *args, **options):
+        path = os.path.join(DATA_ROOT, options['filename'])
+        reader = read_json if path.endswith('.json') else read_csv
+        start = time.perf_counter()
+        total = 0
         try:
-            with open(
-                    os.path.join(DATA_ROOT, options['filename']),
-                    newline='',
-                    encoding='utf8'
-            ) as csv_file:
-                data = csv.reader(csv_file)
-                for row in data:
-                    name, measurement_unit = row
-                    Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
+            with open(path, newline='', encoding='utf8') as file, \
+                    transaction.atomic():
+                count_before = Ingredient.objects.count()
+                for chunk in chunked(reader(file), options['chunk_size']):
+                    Ingredient.objects.bulk_create(
+                        (Ingredient(name=name,
+                                    measurement_unit=measurement_unit)
+                         for name, measurement_unit in chunk),
+                        ignore_conflicts=True,
                     )
+                    total += len(chunk)
+                inserted = Ingredient.objects.count() - count_before
         except FileNotFoundError:
             raise CommandError('Добавьте файл ingredients в директорию data')
-        logging.info('Successfully loaded all data into database')
+        except (ValueError, KeyError) as error:
+            raise CommandError(f'Некорректная строка в файле: {error}')
+        if inserted:
+            bump_version(INGREDIENTS_VERSION)
+        elapsed = time.perf_counter() - start
+        message = (
+            f'Processed {total} rows in {elapsed:.2f}s '
+            f'({total / elapsed if elapsed else 0:.0f} rows/s): '
+            f'{inserted} inserted, {total - inserted} skipped'
+        )
+        logging.info(message)
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Fix drift in recipe favorites_count and in_carts_count'
+
+    def handle(self, *args, **options):
+        fixed = Recipe.objects.recount_counters()
+        self.stdout.write(self.style.SUCCESS(
+            f'Fixed counters of {fixed} recipes'
+        ))
@@ -0,0 +1,173 @@
+import os
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from ingredients.models import Ingredient
+from recipes.models import (FeedEntry, IngredientWeight, Recipe,
+                            ShoppingCartIngredient, Tag)
+from users.models import Favorite, Follow, ShoppingList, User
+
+from .import_ingredients import DATA_ROOT, chunked, read_csv
+
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+SYNTHETIC_IMAGE = 'media/recipes/images/synthetic.png'
+
+
+class Command(BaseCommand):
+    help = 'Seed a reproducible synthetic dataset for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=len(TAGS))
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=10)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['tags'] < 1:
+            raise CommandError('У каждого рецепта есть тег: --tags >= 1')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        start = time.perf_counter()
+        with transaction.atomic():
+            ingredient_ids = self.seed_ingredients()
+            tag_ids = self.seed_tags(options['tags'])
+            user_ids = self.seed_users(options['users'])
+            recipe_ids = self.seed_recipes(
+                options['recipes'], user_ids, tag_ids, ingredient_ids,
+                options['ingredients_per_recipe'],
+            )
+            self.seed_relations(
+                Follow, 'author_id', user_ids, user_ids,
+                options['follows_per_user'], exclude_self=True,
+            )
+            self.seed_relations(
+                Favorite, 'recipe_id', user_ids, recipe_ids,
+                options['favorites_per_user'],
+            )
+            self.seed_relations(
+                ShoppingList, 'recipe_id', user_ids, recipe_ids,
+                options['carts_per_user'],
+            )
+            Recipe.objects.recount_counters()
+            Recipe.objects.refresh_search_documents()
+            ShoppingCartIngredient.objects.rebuild(user_ids)
+            FeedEntry.objects.rebuild(user_ids)
+            self.reset_sequences()
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.perf_counter() - start:.1f}s'
+        ))
+
+    def log(self, message):
+        self.stdout.write(message)
+
+    def next_ids(self, model, count):
+        first = (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        return range(first, first + count)
+
+    def bulk_create(self, model, objects):
+        total = 0
+        for chunk in chunked(objects, self.batch_size):
+            model.objects.bulk_create(chunk, ignore_conflicts=True)
+            total += len(chunk)
+        return total
+
+    def seed_ingredients(self):
+        path = os.path.join(DATA_ROOT, 'ingredients.csv')
+        try:
+            with open(path, newline='', encoding='utf8') as csv_file:
+                self.bulk_create(Ingredient, (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in read_csv(csv_file)
+                ))
+        except FileNotFoundError:
+            raise CommandError('Добавьте файл ingredients в директорию data')
+        ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+        self.log(f'{len(ingredient_ids)} ingredients')
+        return ingredient_ids
+
+    def seed_tags(self, count):
+        tags = list(TAGS[:count]) + [
+            (f'Тег {number}', f'#{self.random.randrange(0x1000000):06X}',
+             f'tag-{number}')
+            for number in range(len(TAGS), count)
+        ]
+        self.bulk_create(Tag, (
+            Tag(name=name, color=color, slug=slug)
+            for name, color, slug in tags
+        ))
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def seed_users(self, count):
+        password = make_password(None)
+        ids = self.next_ids(User, count)
+        self.bulk_create(User, (
+            User(pk=pk, username=f'user{pk}', email=f'user{pk}@example.com',
+                 first_name='Имя', last_name='Фамилия', password=password)
+            for pk in ids
+        ))
+        self.log(f'{count} users')
+        return list(ids)
+
+    def seed_recipes(self, count, user_ids, tag_ids, ingredient_ids,
+                     per_recipe):
+        ids = self.next_ids(Recipe, count)
+        rand = self.random
+        self.bulk_create(Recipe, (
+            Recipe(pk=pk, author_id=rand.choice(user_ids),
+                   name=f'Рецепт {pk}', text='Синтетический рецепт',
+                   image=SYNTHETIC_IMAGE,
+                   cooking_time=rand.randint(5, 180))
+            for pk in ids
+        ))
+        self.bulk_create(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=pk, tag_id=tag_id)
+            for pk in ids
+            for tag_id in rand.sample(
+                tag_ids, rand.randint(1, min(3, len(tag_ids)))
+            )
+        ))
+        per_recipe = min(per_recipe, len(ingredient_ids))
+        self.bulk_create(IngredientWeight, (
+            IngredientWeight(recipe_id=pk, ingredient_id=ingredient_id,
+                             amount=rand.randint(1, 500))
+            for pk in ids
+            for ingredient_id in rand.sample(ingredient_ids, per_recipe)
+        ))
+        self.log(f'{count} recipes, {count * per_recipe} ingredient rows')
+        return list(ids)
+
+    def seed_relations(self, model, target_field, user_ids, target_ids,
+                       per_user, exclude_self=False):
+        per_user = min(per_user, len(target_ids))
+        rand = self.random
+        total = self.bulk_create(model, (
+            model(user_id=user_id, **{target_field: target_id})
+            for user_id in user_ids
+            for target_id in rand.sample(target_ids, per_user)
+            if not exclude_self or target_id != user_id
+        ))
+        self.log(f'{total} {model._meta.verbose_name_plural}')
+
+    @staticmethod
+    def reset_sequences():
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [User, Recipe]
+        )
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
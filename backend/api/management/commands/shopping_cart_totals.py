@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify per-user shopping cart ingredient totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help='Only report drift, do not rewrite rows')
+        parser.add_argument('--user', type=int, action='append',
+                            dest='user_ids',
+                            help='Limit to the given user id (repeatable)')
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if not options['verify']:
+            rows = ShoppingCartIngredient.objects.rebuild(user_ids)
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {rows} shopping cart totals'
+            ))
+            return
+
+        expected = ShoppingCartIngredient.objects.expected(user_ids)
+        stored = ShoppingCartIngredient.objects.all()
+        if user_ids is not None:
+            stored = stored.filter(user_id__in=user_ids)
+        actual = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in stored.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        }
+        drift = [
+            (key, expected.get(key), actual.get(key))
+            for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for (user_id, ingredient_id), want, have in sorted(drift):
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'expected {want}, stored {have}'
+            )
+        if drift:
+            raise CommandError(f'{len(drift)} shopping cart totals drifted')
+        self.stdout.write(self.style.SUCCESS('Shopping cart totals match'))
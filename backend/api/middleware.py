@@ -0,0 +1,163 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('foodgram.requests')
+
+# Recorder текущего запроса: соединения с базой у каждого потока свои,
+# и api.async_views.offload ставит его на соединения потока из пула.
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+class QueryRecorder:
+    """execute_wrapper, считающий запросы к базе и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        return {
+            sql: count for sql, count in self.statements.items()
+            if count >= threshold
+        }
+
+    @contextmanager
+    def installed(self):
+        """Ставит recorder на все соединения текущего потока."""
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+@contextmanager
+def profile_section(request, name):
+    """Добавляет время блока к метрике name профилируемого запроса.
+
+    Вложенные блоки с тем же именем не считаются повторно.
+    """
+    timings = getattr(request, '_profiling', None)
+    if timings is None or name in timings['active']:
+        yield
+        return
+    timings['active'].add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings['active'].discard(name)
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+class RequestProfilingMiddleware:
+    """Число и время запросов к базе, время view, сериализации
+    и рендеринга.
+
+    Результаты уходят в заголовок Server-Timing и в лог
+    foodgram.requests. Повторяющиеся SQL-шаблоны (признак N+1)
+    пишутся с уровнем WARNING. При REQUEST_PROFILE_SAMPLE_RATE > 0
+    часть запросов профилируется cProfile, и статистика медленных
+    сохраняется в REQUEST_PROFILE_DIR.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request._profiling = timings = {'active': set()}
+        recorder = QueryRecorder()
+        profiler = None
+        if random.random() < settings.REQUEST_PROFILE_SAMPLE_RATE:
+            profiler = cProfile.Profile()
+        start = time.perf_counter()
+        token = current_recorder.set(recorder)
+        with recorder.installed():
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                current_recorder.reset(token)
+        total = time.perf_counter() - start
+
+        metrics = {
+            'db': (recorder.duration, f'{recorder.count} queries'),
+            'total': (total, None),
+        }
+        for name in ('view', 'serializer', 'render'):
+            if name in timings:
+                metrics[name] = (timings[name], None)
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.1f}'
+            + (f';desc="{description}"' if description else '')
+            for name, (duration, description) in metrics.items()
+        )
+
+        duplicates = recorder.duplicates(settings.REQUEST_DUPLICATE_QUERIES)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'duplicate_queries': sum(duplicates.values()),
+            **{f'{name}_ms': round(duration * 1000, 1)
+               for name, (duration, _) in metrics.items()},
+        }
+        if duplicates:
+            logger.warning(json.dumps({
+                **record, 'duplicates': duplicates
+            }, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
+
+        if (profiler is not None
+                and total * 1000 >= settings.REQUEST_PROFILE_SLOW_MS):
+            self.dump_profile(profiler, request)
+        return response
+
+    @staticmethod
+    def dump_profile(profiler, request):
+        os.makedirs(settings.REQUEST_PROFILE_DIR, exist_ok=True)
+        name = '{}_{}_{}.prof'.format(
+            time.strftime('%Y%m%d-%H%M%S'),
+            request.method,
+            request.path.strip('/').replace('/', '_') or 'root',
+        )
+        profiler.dump_stats(os.path.join(settings.REQUEST_PROFILE_DIR, name))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._profiling['view_start'] = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        timings = request._profiling
+        render_start = time.perf_counter()
+        if 'view_start' in timings:
+            timings['view'] = render_start - timings['view_start']
+
+        def finish_render(response):
+            timings['render'] = time.perf_counter() - render_start
+
+        response.add_post_render_callback(finish_render)
+        return response
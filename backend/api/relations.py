@@ -0,0 +1,95 @@
+from array import array
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from users.models import Favorite, Follow, ShoppingList
+
+from .cache import initial_version
+
+FAVORITES = 'favorites'
+CART = 'cart'
+FOLLOWING = 'following'
+RELATIONS = {
+    FAVORITES: (Favorite, 'recipe_id'),
+    CART: (ShoppingList, 'recipe_id'),
+    FOLLOWING: (Follow, 'author_id'),
+}
+KINDS = {model: kind for kind, (model, _) in RELATIONS.items()}
+VERSION_KEY = 'foodgram:relations:{}:{}:version'
+IDS_KEY = 'foodgram:relations:{}:{}:{}'
+
+
+def bump_relation(user_id, kind):
+    key = VERSION_KEY.format(user_id, kind)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, initial_version(), timeout=None)
+
+
+def bump_relation_on_commit(user_id, kind):
+    transaction.on_commit(partial(bump_relation, user_id, kind))
+
+
+class UserRelations:
+    """id избранных рецептов, рецептов в корзине и авторов в
+    подписках пользователя.
+
+    Наборы загружаются один раз на запрос: сначала из общего кэша
+    (отсортированные массивы int64 под версией пользователя), при
+    промахе — одним запросом values_list на каждый набор. Добавление
+    и удаление меняют версию после коммита, старые массивы просто
+    перестают читаться.
+    """
+
+    def __init__(self, user):
+        self.user_id = None if user.is_anonymous else user.pk
+        self.sets = None
+
+    def ids(self, kind):
+        if self.user_id is None:
+            return frozenset()
+        if self.sets is None:
+            self.sets = self.load()
+        return self.sets[kind]
+
+    def load(self):
+        version_keys = {
+            kind: VERSION_KEY.format(self.user_id, kind) for kind in RELATIONS
+        }
+        versions = cache.get_many(version_keys.values())
+        for kind, key in version_keys.items():
+            if key not in versions:
+                cache.add(key, initial_version(), timeout=None)
+                versions[key] = cache.get(key)
+        ids_keys = {
+            kind: IDS_KEY.format(
+                self.user_id, kind, versions[version_keys[kind]]
+            )
+            for kind in RELATIONS
+        }
+        cached = cache.get_many(ids_keys.values())
+        sets = {}
+        for kind, key in ids_keys.items():
+            ids = cached.get(key)
+            if ids is None:
+                # Версия прочитана до запроса: если набор изменится,
+                # пока он загружается, запись уйдёт под старую версию.
+                model, field = RELATIONS[kind]
+                ids = array('q', sorted(model.objects.filter(
+                    user_id=self.user_id
+                ).values_list(field, flat=True)))
+                cache.set(key, ids, settings.RELATIONS_CACHE_TIMEOUT)
+            sets[kind] = frozenset(ids)
+        return sets
+
+
+def user_relations(request):
+    """UserRelations текущего запроса, создаются при первом обращении."""
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        relations = request._user_relations = UserRelations(request.user)
+    return relations
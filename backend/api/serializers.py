@@ -1,15 +1,36 @@
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
 from ingredients.models import Ingredient
-from recipes.models import IngredientWeight, Recipe, Tag
-from users.models import Favorite, Follow, ShoppingList, User
+from recipes.models import (IngredientWeight, Recipe, ShoppingCartIngredient,
+                            Tag)
+from users.models import Follow, User
 
+from .feed import schedule_fan_out
+from .image_variants import schedule_image_processing
+from .middleware import profile_section
+from .relations import CART, FAVORITES, FOLLOWING, user_relations
 
-class IngredientSerializer(serializers.ModelSerializer):
+
+class ProfiledSerializerMixin:
+    """Время to_representation идёт в метрику serializer
+    RequestProfilingMiddleware, без профилирования ничего не делает."""
+
+    def to_representation(self, instance):
+        with profile_section(self.context.get('request'), 'serializer'):
+            return super().to_representation(instance)
+
+
+class ProfiledModelSerializer(ProfiledSerializerMixin,
+                              serializers.ModelSerializer):
+    pass
+
+
+class IngredientSerializer(ProfiledModelSerializer):
 
     class Meta:
         fields = ('id', 'name', 'measurement_unit')
@@ -17,22 +38,12 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
 
 
-class IngredientWeightSerializer(serializers.ModelSerializer):
-    id = serializers.SerializerMethodField()
-    name = serializers.SerializerMethodField()
-    measurement_unit = serializers.SerializerMethodField()
-
-    @staticmethod
-    def get_name(obj):
-        return obj.ingredient.name
-
-    @staticmethod
-    def get_measurement_unit(obj):
-        return obj.ingredient.measurement_unit
-
-    @staticmethod
-    def get_id(obj):
-        return obj.ingredient.id
+class IngredientWeightSerializer(ProfiledModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
 
     class Meta:
         model = IngredientWeight
@@ -40,7 +51,7 @@ class IngredientWeightSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(ProfiledModelSerializer):
 
     class Meta:
         fields = ('id', 'name', 'color', 'slug')
@@ -48,7 +59,7 @@ class TagSerializer(serializers.ModelSerializer):
         model = Tag
 
 
-class RecipeSmallSerializer(serializers.ModelSerializer):
+class RecipeSmallSerializer(ProfiledModelSerializer):
 
     class Meta:
         model = Recipe
@@ -60,41 +71,18 @@ class RecipeSmallSerializer(serializers.ModelSerializer):
         ]
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
-    id = serializers.ReadOnlyField(source='author.id')
-    email = serializers.ReadOnlyField(source='author.email')
-    username = serializers.ReadOnlyField(source='author.username')
-    first_name = serializers.ReadOnlyField(source='author.first_name')
-    last_name = serializers.ReadOnlyField(source='author.last_name')
-    is_subscribed = serializers.SerializerMethodField()
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Follow
-        fields = ('email', 'id', 'username', 'first_name', 'last_name',
-                  'is_subscribed', 'recipes', 'recipes_count')
-
-    @staticmethod
-    def get_is_subscribed(obj):
-        return Follow.objects.filter(
-            user=obj.user, author=obj.author
-        ).exists()
-
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        queryset = Recipe.objects.filter(author=obj.author)
-        if limit:
-            queryset = queryset[:int(limit)]
-        return RecipeSmallSerializer(queryset, many=True).data
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPES_BATCH_LIMIT,
+    )
 
-    @staticmethod
-    def get_recipes_count(obj):
-        return Recipe.objects.filter(author=obj.author).count()
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
 
 
-class SubscribeCreateDeleteSerializer(serializers.ModelSerializer):
+class SubscribeCreateDeleteSerializer(ProfiledModelSerializer):
 
     class Meta:
         model = Follow
@@ -102,16 +90,9 @@ class SubscribeCreateDeleteSerializer(serializers.ModelSerializer):
             'user',
             'author'
         ]
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'author'),
-                message='Подписка уже есть'
-            )
-        ]
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(ProfiledSerializerMixin, UserSerializer):
     is_subscribed = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -126,10 +107,30 @@ class CustomUserSerializer(UserSerializer):
         ]
 
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user is None or user.is_anonymous:
-            return False
-        return Follow.objects.filter(author=obj, user=user).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.pk in user_relations(self.context['request']).ids(
+            FOLLOWING
+        )
+
+
+class SubscriptionSerializer(CustomUserSerializer):
+    recipes = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = User
+        fields = ('email', 'id', 'username', 'first_name', 'last_name',
+                  'is_subscribed', 'recipes', 'recipes_count')
+
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'recipes_preview', None)
+        if recipes is None:
+            recipes = obj.author_recipes.all()
+            limit = self.context.get('recipes_limit')
+            if limit is not None:
+                recipes = recipes[:limit]
+        return RecipeSmallSerializer(recipes, many=True).data
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -145,9 +146,10 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         ]
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(ProfiledModelSerializer):
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
+    images = serializers.SerializerMethodField()
     ingredients = IngredientWeightSerializer(many=True, source='weight')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -162,24 +164,32 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'images',
                   'text',
                   'cooking_time')
         model = Recipe
         read_only_fields = ('id',)
 
+    def get_images(self, obj):
+        """Ссылки на уменьшенные копии; пусто, пока они не готовы."""
+        request = self.context.get('request')
+        return {
+            variant: {
+                image_format: request.build_absolute_uri(
+                    default_storage.url(name)
+                )
+                for image_format, name in formats.items()
+            }
+            for variant, formats in obj.image_variants.items()
+        }
+
     def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if user is None or user.is_anonymous:
-            return False
-        recipe = obj
-        return Favorite.objects.filter(user=user, recipe=recipe).exists()
+        return obj.pk in user_relations(self.context['request']).ids(
+            FAVORITES
+        )
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if user is None or user.is_anonymous:
-            return False
-        recipe = obj
-        return ShoppingList.objects.filter(user=user, recipe=recipe).exists()
+        return obj.pk in user_relations(self.context['request']).ids(CART)
 
 
 class IngredientWeightCreateSerializer(serializers.ModelSerializer):
@@ -192,10 +202,10 @@ class IngredientWeightCreateSerializer(serializers.ModelSerializer):
 
     @staticmethod
     def get_id(obj):
-        return obj.ingredient.id
+        return obj.ingredient_id
 
 
-class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
+class RecipeCreateUpdateSerializer(ProfiledModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(
         many=True, queryset=Tag.objects.all()
     )
@@ -223,13 +233,8 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         tags = self.initial_data.get('tags')
         self.ingredients_validate(ingredients)
         self.tags_validate(tags)
-
-        if ingredients:
-            self.ingredients_validate(ingredients)
-            data['ingredients'] = ingredients
-        if tags:
-            self.tags_validate(tags)
-            data['tags'] = tags
+        data['ingredients'] = ingredients
+        data['tags'] = tags
         return data
 
     @staticmethod
@@ -241,24 +246,31 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             )
         for ingredient in ingredients:
             amount = ingredient.get('amount')
-            ingredient_id = ingredient.get('id')
-            if ingredient_id in ingredients_set:
-                raise serializers.ValidationError(
-                    'Ингредиенты в рецепте не должены повторяться.'
-                )
             try:
-                int(ingredient_id)
-            except ValueError:
+                ingredient_id = int(ingredient.get('id'))
+            except (TypeError, ValueError):
                 raise serializers.ValidationError(
                     'Id ингридиента должно быть числом'
                 )
+            if ingredient_id in ingredients_set:
+                raise serializers.ValidationError(
+                    'Ингредиенты в рецепте не должены повторяться.'
+                )
             try:
                 int(amount)
-            except ValueError:
+            except (TypeError, ValueError):
                 raise serializers.ValidationError(
                     'Количество ингридиента должно быть числом'
                 )
             ingredients_set.add(ingredient_id)
+        missing = ingredients_set - Ingredient.objects.in_bulk(
+            ingredients_set
+        ).keys()
+        if missing:
+            raise serializers.ValidationError(
+                'Ингредиенты не найдены: '
+                + ', '.join(str(pk) for pk in sorted(missing))
+            )
 
     @staticmethod
     def tags_validate(tags):
@@ -272,36 +284,84 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             )
 
     @staticmethod
-    def create_ingredients(ingredients, recipe):
-        for ingredient in ingredients:
-            temp_ingredient = get_object_or_404(
-                Ingredient, id=ingredient['id']
-            )
-            IngredientWeight.objects.create(
-                recipe=recipe,
-                ingredient=temp_ingredient,
-                amount=ingredient['amount']
+    def ingredient_amounts(ingredients):
+        return {
+            int(ingredient['id']): int(ingredient['amount'])
+            for ingredient in ingredients
+        }
+
+    def create_ingredients(self, ingredients, recipe):
+        IngredientWeight.objects.bulk_create(
+            IngredientWeight(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
             )
+            for ingredient_id, amount in self.ingredient_amounts(
+                ingredients
+            ).items()
+        )
 
-    @staticmethod
-    def create_tags(tags, recipe):
-        for tag in tags:
-            recipe.tags.add(tag)
+    def update_ingredients(self, ingredients, recipe):
+        """Пишет только изменившиеся строки состава.
+        Возвращает старый и новый состав {ingredient_id: amount}."""
+        new_amounts = self.ingredient_amounts(ingredients)
+        current = {
+            weight.ingredient_id: weight
+            for weight in IngredientWeight.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: weight.amount
+            for ingredient_id, weight in current.items()
+        }
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            weight = current.get(ingredient_id)
+            if weight is not None and weight.amount != amount:
+                weight.amount = amount
+                changed.append(weight)
+        deleted = [
+            weight.pk for ingredient_id, weight in current.items()
+            if ingredient_id not in new_amounts
+        ]
+        if deleted:
+            IngredientWeight.objects.filter(pk__in=deleted).delete()
+        IngredientWeight.objects.bulk_update(changed, ['amount'])
+        IngredientWeight.objects.bulk_create(
+            IngredientWeight(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current
+        )
+        return old_amounts, new_amounts
 
+    @transaction.atomic
     def create(self, validated_data):
         author = self.context.get('request').user
         tags = validated_data.pop('tags')
         validated_data.pop('weight')
         ingr = validated_data.pop('ingredients')
         recipe = Recipe.objects.create(author=author, **validated_data)
-        self.create_tags(tags, recipe)
+        recipe.tags.set(tags)
         self.create_ingredients(ingr, recipe)
+        Recipe.objects.filter(pk=recipe.pk).refresh_search_documents()
+        schedule_image_processing(recipe)
+        schedule_fan_out(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        instance.tags.clear()
-        IngredientWeight.objects.filter(recipe=instance).delete()
-        self.create_tags(validated_data.pop('tags'), instance)
+        instance.tags.set(validated_data.pop('tags'))
         validated_data.pop('weight')
-        self.create_ingredients(validated_data.pop('ingredients'), instance)
-        return super().update(instance, validated_data)
+        old_amounts, new_amounts = self.update_ingredients(
+            validated_data.pop('ingredients'), instance
+        )
+        ShoppingCartIngredient.objects.change_recipe(
+            instance, old_amounts, new_amounts
+        )
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+        instance = super().update(instance, validated_data)
+        Recipe.objects.filter(pk=instance.pk).refresh_search_documents()
+        if 'image' in validated_data:
+            schedule_image_processing(instance)
+        return instance
@@ -0,0 +1,194 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import uuid
+
+from django.conf import settings
+from django.db.models import F
+from django.http import FileResponse, StreamingHttpResponse
+
+from ingredients.models import Ingredient
+from recipes.models import ShoppingCartIngredient
+
+from .cache import get_version
+from .create_pdf_A4 import create_pdf
+from .ingredient_index import INGREDIENTS_VERSION
+
+TITLE = 'Список покупок'
+FILENAME = 'shopping_list'
+CHUNK_SIZE = 64 * 1024
+ROWS_PER_CHUNK = 500
+
+
+def cart_digest(user):
+    """Хэш содержимого корзины.
+
+    Читаются только итоги (ingredient_id, amount) без join с
+    ингредиентами; версия справочника учитывается, чтобы
+    переименование ингредиента тоже меняло хэш.
+    """
+    rows = ShoppingCartIngredient.objects.filter(
+        user=user
+    ).order_by('ingredient_id').values_list('ingredient_id', 'amount')
+    digest = hashlib.sha256(
+        f'{get_version(INGREDIENTS_VERSION)}:'.encode()
+    )
+    for ingredient_id, amount in rows.iterator():
+        digest.update(f'{ingredient_id}={amount};'.encode())
+    return digest.hexdigest()
+
+
+def cart_ingredients(user):
+    return Ingredient.objects.filter(
+        cart_totals__user=user
+    ).annotate(amount=F('cart_totals__amount')).order_by('name').iterator()
+
+
+def line(number, ingredient):
+    return (f'{number}. {ingredient.name.capitalize()} '
+            f'({ingredient.measurement_unit}) - {ingredient.amount}')
+
+
+def batched(strings):
+    """Склеивает строки в куски по ROWS_PER_CHUNK."""
+    batch = []
+    for string in strings:
+        batch.append(string)
+        if len(batch) >= ROWS_PER_CHUNK:
+            yield ''.join(batch).encode()
+            batch = []
+    if batch:
+        yield ''.join(batch).encode()
+
+
+def render_txt(ingredients):
+    yield f'{TITLE}\n\n'.encode()
+    yield from batched(
+        f'{line(number, ingredient)}\n'
+        for number, ingredient in enumerate(ingredients, start=1)
+    )
+
+
+def render_csv(ingredients):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def rows():
+        writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            writer.writerow((
+                ingredient.name, ingredient.measurement_unit,
+                ingredient.amount
+            ))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    # BOM, чтобы Excel открыл кириллицу без вопросов.
+    yield '\ufeff'.encode()
+    yield from batched(rows())
+
+
+def render_json(ingredients):
+    def items():
+        separator = ''
+        for ingredient in ingredients:
+            item = json.dumps({
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit,
+                'amount': ingredient.amount,
+            }, ensure_ascii=False)
+            yield f'{separator}{item}'
+            separator = ','
+
+    yield '['.encode()
+    yield from batched(items())
+    yield ']'.encode()
+
+
+def render_pdf(ingredients):
+    # reportlab собирает документ целиком; готовый файл лежит в
+    # SpooledTemporaryFile и отдаётся кусками.
+    with create_pdf(TITLE, ingredients) as buffer:
+        yield from iter(lambda: buffer.read(CHUNK_SIZE), b'')
+
+
+EXPORT_FORMATS = {
+    'pdf': ('application/pdf', render_pdf),
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'json': ('application/json', render_json),
+}
+
+
+def cache_dir(user):
+    path = os.path.join(settings.SHOPPING_LIST_CACHE_DIR, str(user.pk))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_through(chunks, directory, filename):
+    """Отдаёт куски дальше и параллельно пишет их в кэш.
+
+    Файл появляется под своим именем только после полной записи;
+    старые выгрузки того же формата удаляются.
+    """
+    path = os.path.join(directory, filename)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    completed = False
+    try:
+        with open(tmp_path, 'wb') as tmp:
+            for chunk in chunks:
+                tmp.write(chunk)
+                yield chunk
+        os.replace(tmp_path, path)
+        completed = True
+    finally:
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    extension = os.path.splitext(filename)[1]
+    for name in os.listdir(directory):
+        if name != filename and name.endswith(extension):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def export_response(user, export_format, stream=True):
+    """Ответ с выгрузкой корзины в нужном формате.
+
+    Ключ кэша — хэш содержимого корзины, поэтому изменённая корзина
+    просто не находит старый файл. Повторная выгрузка читает файл с
+    диска без запросов к ингредиентам и без рендеринга. При
+    stream=False промах рендерится в файл целиком до ответа: так
+    ASGI-обработчику не приходится ходить в базу из event loop.
+    """
+    content_type, render = EXPORT_FORMATS[export_format]
+    directory = cache_dir(user)
+    filename = f'{cart_digest(user)}.{export_format}'
+    download_name = f'{FILENAME}.{export_format}'
+    path = os.path.join(directory, filename)
+    try:
+        cached = open(path, 'rb')
+    except FileNotFoundError:
+        chunks = write_through(
+            render(cart_ingredients(user)), directory, filename
+        )
+        if stream:
+            response = StreamingHttpResponse(
+                chunks, content_type=content_type
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename="{download_name}"'
+            )
+            return response
+        for _ in chunks:
+            pass
+        cached = open(path, 'rb')
+    return FileResponse(
+        cached, as_attachment=True, filename=download_name,
+        content_type=content_type,
+    )
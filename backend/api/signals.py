@@ -0,0 +1,91 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from ingredients.models import Ingredient
+from recipes.models import IngredientWeight, Recipe, Tag
+from users.models import Favorite, Follow, ShoppingList, User
+
+from .authentication import forget_token
+from .cache import RECIPES_VERSION, TAGS_VERSION, bump_version
+from .ingredient_index import INGREDIENTS_VERSION
+from .relations import KINDS, bump_relation_on_commit
+
+
+def bump_on_commit(*names):
+    """Версия меняется после коммита, чтобы параллельный запрос
+    не закэшировал данные, которые ещё не видны в базе."""
+    for name in names:
+        transaction.on_commit(partial(bump_version, name))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredients_changed(**kwargs):
+    bump_on_commit(INGREDIENTS_VERSION, RECIPES_VERSION)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tags_changed(**kwargs):
+    bump_on_commit(TAGS_VERSION, RECIPES_VERSION)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(
+            Recipe.objects.filter(
+                weight__ingredient=instance
+            ).distinct().refresh_search_documents
+        )
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(
+            Recipe.objects.filter(tags=instance).refresh_search_documents
+        )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=IngredientWeight)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(**kwargs):
+    bump_on_commit(RECIPES_VERSION)
+
+
+def forget_tokens_on_commit(keys):
+    for key in keys:
+        transaction.on_commit(partial(forget_token, key))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    forget_tokens_on_commit((instance.key,))
+
+
+@receiver(post_save, sender=Token)
+def token_saved(instance, created, **kwargs):
+    # Новый токен ещё не мог попасть в кэш.
+    if not created:
+        forget_tokens_on_commit((instance.key,))
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, created, update_fields, **kwargs):
+    # Вход обновляет только last_login; кэш токенов при этом не
+    # сбрасывается. Деактивация и прочие изменения — сбрасывают.
+    if not created and update_fields != frozenset(('last_login',)):
+        forget_tokens_on_commit(
+            Token.objects.filter(user=instance).values_list('key', flat=True)
+        )
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingList)
+@receiver((post_save, post_delete), sender=Follow)
+def relation_changed(sender, instance, **kwargs):
+    bump_relation_on_commit(instance.user_id, KINDS[sender])
@@ -0,0 +1,100 @@
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.test import TestCase
+
+from ingredients.models import Ingredient
+from recipes.models import IngredientWeight, Recipe, ShoppingCartIngredient
+from users.models import Favorite, ShoppingList, User
+
+
+class AdminConsistencyTest(TestCase):
+    """Правки и удаления в админке не расходятся с итогами корзин
+    и счётчиками рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='!'
+        )
+        cls.buyer = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='!'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ингредиент{number}',
+                                      measurement_unit='г')
+            for number in range(2)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                name=f'рецепт{number}', text='', image='recipe.png',
+                author=cls.admin, cooking_time=1,
+            )
+            for number in range(2)
+        ]
+        for recipe in cls.recipes:
+            for amount, ingredient in enumerate(cls.ingredients, start=1):
+                IngredientWeight.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=amount
+                )
+            ShoppingList.objects.create(user=cls.buyer, recipe=recipe)
+        ShoppingCartIngredient.objects.rebuild()
+        Recipe.objects.recount_counters()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assert_totals_consistent(self):
+        self.assertEqual(
+            {
+                (row.user_id, row.ingredient_id): row.amount
+                for row in ShoppingCartIngredient.objects.all()
+            },
+            ShoppingCartIngredient.objects.expected(),
+        )
+
+    def delete_action(self, url, objects):
+        response = self.client.post(url, {
+            'action': 'delete_selected',
+            ACTION_CHECKBOX_NAME: [obj.pk for obj in objects],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+
+    def test_recipe_delete_view(self):
+        response = self.client.post(
+            f'/admin/recipes/recipe/{self.recipes[0].pk}/delete/',
+            {'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assert_totals_consistent()
+
+    def test_recipe_delete_action(self):
+        self.delete_action('/admin/recipes/recipe/', self.recipes)
+        self.assertFalse(ShoppingCartIngredient.objects.exists())
+
+    def test_ingredient_weight_delete_action(self):
+        self.delete_action(
+            '/admin/recipes/ingredientweight/',
+            IngredientWeight.objects.filter(ingredient=self.ingredients[0]),
+        )
+        self.assert_totals_consistent()
+
+    def test_shopping_list_delete_action(self):
+        self.delete_action(
+            '/admin/users/shoppinglist/',
+            ShoppingList.objects.filter(recipe=self.recipes[0]),
+        )
+        self.assert_totals_consistent()
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].in_carts_count, 0)
+
+    def test_favorite_add_and_delete(self):
+        recipe = self.recipes[0]
+        response = self.client.post('/admin/users/favorite/add/', {
+            'user': self.buyer.pk, 'recipe': recipe.pk,
+        })
+        self.assertEqual(response.status_code, 302)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 1)
+        self.delete_action('/admin/users/favorite/', Favorite.objects.all())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_cache_key, token_lru
+from users.models import User
+
+
+class CachingTokenAuthenticationTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_lru.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='secret'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def me(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/users/me/')
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_cached_entry_has_no_password(self):
+        self.me()
+        entry = cache.get(token_cache_key(self.token.key))
+        self.assertIn(self.user.pk, entry)
+        self.assertNotIn(self.user.password, entry)
+
+    def test_cached_token_skips_database(self):
+        self.me()
+        response, queries = self.me()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['username'], 'reader')
+        self.assertFalse(any('authtoken_token' in sql for sql in queries))
+
+    def test_user_change_forgets_token(self):
+        self.me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        response, _ = self.me()
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_delete_forgets_token(self):
+        self.me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        response, _ = self.me()
+        self.assertEqual(response.status_code, 401)
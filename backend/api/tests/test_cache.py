@@ -0,0 +1,26 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from api.cache import bump_version, get_version
+
+
+class VersionTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lost_version_does_not_restart(self):
+        with mock.patch('api.cache.time.time', return_value=1000):
+            version = get_version('test')
+            for _ in range(3):
+                bump_version('test')
+        cache.clear()
+        with mock.patch('api.cache.time.time', return_value=1001):
+            self.assertGreater(get_version('test'), version + 3)
+
+    def test_bump_of_missing_version_is_seeded(self):
+        with mock.patch('api.cache.time.time', return_value=1000):
+            self.assertEqual(bump_version('test'), get_version('test'))
+            self.assertEqual(get_version('test'), 1000 * 1000)
@@ -0,0 +1,114 @@
+from contextlib import ExitStack
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_lru
+from recipes.models import Recipe
+from users.models import User
+
+REPLICA = 'replica_1'
+
+
+class ReplicaRouterTest(TransactionTestCase):
+    """Маршрутизация между default и репликой на двух соединениях
+    SQLite к одной тестовой базе (как TEST MIRROR в настройках)."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплика добавляется, только если её нет в окружении: второе
+        # соединение к той же тестовой базе, как с TEST MIRROR.
+        # connections.settings — тот же словарь, что settings.DATABASES,
+        # поэтому replica_aliases() её тоже видит.
+        cls.added_replica = REPLICA not in connections.settings
+        if cls.added_replica:
+            connections.settings[REPLICA] = {
+                **connections['default'].settings_dict,
+                'TEST': {'MIRROR': 'default'},
+            }
+        # Раннер тестов создаёт базы до setUpClass, поэтому реплика
+        # объявляется здесь, а не атрибутом класса.
+        cls.databases = {'default', REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if cls.added_replica:
+            connections[REPLICA].close()
+            del connections.settings[REPLICA]
+            delattr(connections._connections, REPLICA)
+
+    def setUp(self):
+        cache.clear()
+        token_lru.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='!'
+        )
+        self.recipe = Recipe.objects.create(
+            name='рецепт', text='', image='recipe.png', author=self.user,
+            cooking_time=1,
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + (
+            Token.objects.create(user=self.user).key
+        ))
+
+    def request(self, method, path):
+        """Ответ и SQL-запросы, ушедшие на default и на реплику."""
+        with ExitStack() as stack:
+            queries = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias])
+                )
+                for alias in ('default', REPLICA)
+            }
+            response = getattr(self.client, method)(path)
+        return response, {
+            alias: [query['sql'] for query in context.captured_queries]
+            for alias, context in queries.items()
+        }
+
+    def test_safe_reads_go_to_replica(self):
+        response, queries = self.request('get', '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any(
+            'recipes_recipe' in sql for sql in queries[REPLICA]
+        ))
+        self.assertFalse(any(
+            'recipes_recipe' in sql for sql in queries['default']
+        ))
+
+    def test_auth_reads_stay_on_default(self):
+        response, queries = self.request('get', '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any(
+            'authtoken_token' in sql for sql in queries['default']
+        ))
+        self.assertFalse(any(
+            'FROM "authtoken_token"' in sql or 'FROM "auth_user"' in sql
+            for sql in queries[REPLICA]
+        ))
+
+    def test_writes_go_to_default(self):
+        response, queries = self.request(
+            'post', f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(any(
+            sql.startswith('INSERT') for sql in queries['default']
+        ))
+        self.assertEqual(queries[REPLICA], [])
+
+    def test_client_reads_default_after_write(self):
+        self.request('post', f'/api/recipes/{self.recipe.pk}/favorite/')
+        response, queries = self.request('get', '/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries[REPLICA], [])
+        self.assertTrue(any(
+            'recipes_recipe' in sql for sql in queries['default']
+        ))
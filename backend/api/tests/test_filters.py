@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class RecipeTagFilterTest(TestCase):
+    """Фильтр по тегам: без ?tags отдаются все рецепты, рецепт с
+    несколькими подходящими тегами не дублируется."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='!'
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'тег{number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(2)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                name=f'рецепт{number}', text='', image='recipe.png',
+                author=author, cooking_time=1,
+            )
+            for number in range(3)
+        ]
+        cls.recipes[0].tags.set(cls.tags)
+        cls.recipes[1].tags.set(cls.tags[1:])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def recipe_ids(self, params):
+        response = self.client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        return sorted(recipe['id'] for recipe in response.data['results'])
+
+    def test_without_tags_returns_all(self):
+        self.assertEqual(
+            self.recipe_ids({}), sorted(recipe.pk for recipe in self.recipes)
+        )
+
+    def test_detail_without_tags(self):
+        response = self.client.get(f'/api/recipes/{self.recipes[2].pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_several_tags_do_not_duplicate(self):
+        self.assertEqual(
+            self.recipe_ids({'tags': [tag.slug for tag in self.tags]}),
+            sorted(recipe.pk for recipe in self.recipes[:2]),
+        )
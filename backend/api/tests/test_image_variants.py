@@ -0,0 +1,49 @@
+import io
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from api.image_variants import IMAGE_VARIANTS, process_recipe_image
+from recipes.models import Recipe
+from users.models import User
+
+
+class ProcessRecipeImageTest(TestCase):
+    """Обработанная картинка подменяет исходную одним UPDATE."""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        buffer = io.BytesIO()
+        Image.new('RGB', (50, 40), 'red').save(buffer, format='PNG')
+        self.name = default_storage.save(
+            'recipes/images/photo.png', ContentFile(buffer.getvalue())
+        )
+        self.recipe = Recipe.objects.create(
+            name='рецепт', text='', image=self.name, cooking_time=1,
+            author=User.objects.create_user(
+                username='author', email='author@example.com', password='!'
+            ),
+        )
+
+    def test_original_is_replaced_after_update(self):
+        process_recipe_image(self.recipe.pk, self.name)
+        self.recipe.refresh_from_db()
+        self.assertNotEqual(self.recipe.image.name, self.name)
+        self.assertTrue(default_storage.exists(self.recipe.image.name))
+        self.assertFalse(default_storage.exists(self.name))
+        self.assertEqual(set(self.recipe.image_variants), set(IMAGE_VARIANTS))
+
+    def test_replaced_image_is_kept(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(image='other.png')
+        process_recipe_image(self.recipe.pk, self.name)
+        self.assertTrue(default_storage.exists(self.name))
+        self.assertEqual(default_storage.listdir('recipes/images'),
+                         (['variants'], ['photo.png']))
@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+
+BEFORE = [
+    ('ingredients', '0001_initial'),
+    ('recipes', '0005_shoppingcartingredient'),
+    ('users', '0003_alter_shoppinglist_recipe_alter_shoppinglist_user'),
+]
+AFTER = [
+    ('ingredients', '0002_unique_ingredient_unit'),
+    ('users', '0004_unique_relations'),
+]
+MODELS = (
+    ('auth', 'User'),
+    ('ingredients', 'Ingredient'),
+    ('recipes', 'Recipe'),
+    ('recipes', 'IngredientWeight'),
+    ('recipes', 'ShoppingCartIngredient'),
+    ('users', 'ShoppingList'),
+    ('users', 'Favorite'),
+)
+
+
+class MergeDuplicatesMigrationTest(TransactionTestCase):
+    """Слияние дубликатов ингредиентов и связей на заполненной базе."""
+
+    def migrate(self, targets):
+        """Исторические модели после миграции к targets."""
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        apps = executor.loader.project_state(targets).apps
+        return SimpleNamespace(**{
+            name: apps.get_model(app_label, name)
+            for app_label, name in MODELS
+        })
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_merge_keeps_weights_and_cart_totals(self):
+        models = self.migrate(BEFORE)
+        author, buyer, other = (
+            models.User.objects.create(
+                username=name, email=f'{name}@example.com'
+            )
+            for name in ('author', 'buyer', 'other')
+        )
+        sugar, sugar_copy, salt = (
+            models.Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('сахар', 'сахар', 'соль')
+        )
+        cake, pie = (
+            models.Recipe.objects.create(name=name, text='', image='x.png',
+                                         cooking_time=1, author=author)
+            for name in ('торт', 'пирог')
+        )
+        for recipe, ingredient, amount in (
+            (cake, sugar, 10), (pie, sugar_copy, 5), (pie, salt, 1),
+        ):
+            models.IngredientWeight.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        for user, recipe in ((buyer, cake), (buyer, pie), (other, pie)):
+            models.ShoppingList.objects.create(user=user, recipe=recipe)
+        for user, ingredient, amount in (
+            (buyer, sugar, 10), (buyer, sugar_copy, 5), (buyer, salt, 1),
+            (other, sugar_copy, 5), (other, salt, 1),
+        ):
+            models.ShoppingCartIngredient.objects.create(
+                user=user, ingredient=ingredient, amount=amount
+            )
+        models.Favorite.objects.create(user=buyer, recipe=cake)
+        models.Favorite.objects.create(user=buyer, recipe=cake)
+
+        models = self.migrate(AFTER)
+        self.assertEqual(
+            sorted(models.Ingredient.objects.values_list('pk', flat=True)),
+            [sugar.pk, salt.pk],
+        )
+        self.assertEqual(
+            sorted(models.IngredientWeight.objects.values_list(
+                'recipe_id', 'ingredient_id', 'amount'
+            )),
+            sorted([(cake.pk, sugar.pk, 10), (pie.pk, sugar.pk, 5),
+                    (pie.pk, salt.pk, 1)]),
+        )
+        self.assertEqual(
+            sorted(models.ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )),
+            sorted([(buyer.pk, sugar.pk, 15), (buyer.pk, salt.pk, 1),
+                    (other.pk, sugar.pk, 5), (other.pk, salt.pk, 1)]),
+        )
+        self.assertEqual(
+            models.Favorite.objects.filter(user_id=buyer.pk).count(), 1
+        )
@@ -0,0 +1,49 @@
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import TestCase, modify_settings
+from rest_framework.test import APIClient
+
+from api.async_views import offload
+from api.middleware import QueryRecorder, current_recorder
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+@modify_settings(MIDDLEWARE={
+    'prepend': 'api.middleware.RequestProfilingMiddleware',
+})
+class RequestProfilingTest(TestCase):
+    """Server-Timing профилирующего middleware."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='!'
+        )
+        Recipe.objects.create(
+            name='рецепт', text='', image='recipe.png',
+            author=author, cooking_time=1,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_serializer_time_is_reported(self):
+        response = APIClient().get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        metrics = [
+            metric.split(';')[0]
+            for metric in response['Server-Timing'].split(', ')
+        ]
+        self.assertEqual(
+            metrics, ['db', 'total', 'view', 'serializer', 'render']
+        )
+
+    def test_offloaded_queries_are_recorded(self):
+        recorder = QueryRecorder()
+        token = current_recorder.set(recorder)
+        try:
+            async_to_sync(offload(Tag.objects.count))()
+        finally:
+            current_recorder.reset(token)
+        self.assertEqual(recorder.count, 1)
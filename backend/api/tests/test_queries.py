@@ -0,0 +1,137 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import token_lru
+from ingredients.models import Ingredient
+from recipes.models import IngredientWeight, Recipe, Tag
+from users.models import Favorite, ShoppingList, User
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='!'
+        )
+        authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='!'
+            )
+            for number in range(3)
+        ]
+        tags = [
+            Tag.objects.create(name=f'тег{number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'ингредиент{number}',
+                                      measurement_unit='г')
+            for number in range(10)
+        ]
+        for number in range(12):
+            recipe = Recipe.objects.create(
+                name=f'рецепт{number}', text='', image='recipe.png',
+                author=authors[number % 3], cooking_time=1,
+            )
+            recipe.tags.set(tags[:1 + number % 3])
+            for offset in range(3):
+                IngredientWeight.objects.create(
+                    recipe=recipe,
+                    ingredient=ingredients[(number + offset) % 10],
+                    amount=offset + 1,
+                )
+            if number % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if number % 3:
+                ShoppingList.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + (
+            Token.objects.get_or_create(user=self.user)[0].key
+        ))
+
+    def count_queries(self, limit):
+        cache.clear()
+        token_lru.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', {'limit': limit})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context.captured_queries)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        self.assertEqual(self.count_queries(2), self.count_queries(12))
+
+
+class RecipeListCountTest(TestCase):
+    """count списков избранного не берётся из кэша."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='!'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                name=f'рецепт{number}', text='', image='recipe.png',
+                author=cls.user, cooking_time=1,
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_favorited_count_follows_changes(self):
+        for count, recipe in enumerate(self.recipes):
+            response = self.client.get('/api/recipes/', {'is_favorited': 1})
+            self.assertEqual(response.data['count'], count)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get('/api/recipes/', {'is_favorited': 1})
+        self.assertEqual(response.data['count'], len(self.recipes))
+
+
+class CachedCountPageTest(TestCase):
+    """Закэшированный count не закрывает новые страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com', password='!'
+        )
+        cls.create_recipes(6)
+
+    @classmethod
+    def create_recipes(cls, count):
+        for number in range(count):
+            Recipe.objects.create(
+                name=f'рецепт{number}', text='', image='recipe.png',
+                author=cls.author, cooking_time=1,
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_page_beyond_cached_count(self):
+        response = self.client.get('/api/recipes/', {'limit': 6})
+        self.assertEqual(response.data['count'], 6)
+        # В TestCase on_commit не срабатывает, и версия рецептов не
+        # меняется: count остаётся прежним.
+        self.create_recipes(6)
+        response = self.client.get('/api/recipes/', {'limit': 6, 'page': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 6)
+        response = self.client.get('/api/recipes/', {'limit': 6, 'page': 3})
+        self.assertEqual(response.status_code, 404)
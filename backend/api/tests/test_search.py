@@ -0,0 +1,62 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from recipes.search import SEARCH_INDEX
+from users.models import User
+
+
+class RecipeSearchTest(TestCase):
+    """Поиск по рецептам на текущей базе: FTS5 на SQLite,
+    SearchVector с GIN-индексом на PostgreSQL."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='!'
+        )
+        cls.by_name, cls.by_text, cls.other = (
+            Recipe.objects.create(name=name, text=text, image='recipe.png',
+                                  author=author, cooking_time=1)
+            for name, text in (
+                ('Пирог с сахаром', 'Испечь.'),
+                ('Пирог', 'Добавить сахар и муку.'),
+                ('Суп', 'Сварить.'),
+            )
+        )
+        Recipe.objects.refresh_search_documents()
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(
+            list(Recipe.objects.search('сахар')),
+            [self.by_name, self.by_text],
+        )
+
+    def test_no_words_finds_nothing(self):
+        self.assertFalse(Recipe.objects.search('!!!').exists())
+
+    def test_search_combines_with_filters(self):
+        self.assertEqual(
+            list(Recipe.objects.filter(name='Пирог').search('сахар')),
+            [self.by_text],
+        )
+
+    def test_search_rejects_cursor(self):
+        client = APIClient()
+        response = client.get('/api/recipes/', {'search': 'сахар',
+                                                'cursor': ''})
+        self.assertEqual(response.status_code, 400)
+        response = client.get('/api/recipes/', {'search': 'сахар',
+                                                'cursor': '',
+                                                'ordering': 'popular'})
+        self.assertEqual(response.status_code, 200)
+
+    @skipUnless(connection.vendor == 'postgresql', 'GIN-индекс PostgreSQL')
+    def test_postgres_search_uses_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = Recipe.objects.search('сахар').explain()
+        self.assertIn(SEARCH_INDEX, plan)
@@ -1,123 +1,318 @@
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (Count, Exists, F, OuterRef, Prefetch, Subquery,
+                              Value)
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from ingredients.models import Ingredient
-from recipes.models import IngredientWeight, Recipe, Tag
+from recipes.models import (FeedEntry, IngredientWeight, Recipe,
+                            ShoppingCartIngredient, Tag)
 from users.models import Favorite, Follow, ShoppingList, User
 
-from .create_pdf_A4 import create_pdf
-from .custom_pagination import CustomPagination
+from .cache import (RECIPES_VERSION, TAGS_VERSION, AnonymousResponseCacheMixin,
+                    ReferenceDataMixin, ReferencePayload)
+from .custom_pagination import (FeedPagination, RecipePagination,
+                                SubscriptionPagination)
+from .feed import feed_queryset
 from .filters import IngredientFilter, RecipeFilter
+from .ingredient_index import INGREDIENTS_VERSION, ingredient_index
 from .permissions import IsAuthorOrReadOnlyPermission
+from .relations import CART, FAVORITES, bump_relation_on_commit
+from .renderers import SHOPPING_LIST_RENDERERS
 from .serializers import (IngredientSerializer, IngredientWeightSerializer,
-                          RecipeCreateUpdateSerializer, RecipeSerializer,
-                          RecipeSmallSerializer,
+                          RecipeCreateUpdateSerializer, RecipeIdsSerializer,
+                          RecipeSerializer, RecipeSmallSerializer,
                           SubscribeCreateDeleteSerializer,
                           SubscriptionSerializer, TagSerializer)
+from .shopping_list import export_response
+from .throttling import ScopedTokenBucketThrottle
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorOrReadOnlyPermission,)
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
+    cache_version_name = RECIPES_VERSION
+    cache_query_params = ('tags', 'author', 'page', 'limit', 'cursor',
+                          'ordering', 'is_favorited', 'is_in_shopping_cart',
+                          'search')
+    stream_exports = True
+    throttle_scope = None
 
-    def get_serializer_class(self):
+    def get_queryset(self):
         if self.action in ('list', 'retrieve'):
+            return Recipe.objects.with_related()
+        return Recipe.objects.all()
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeSerializer
         return RecipeCreateUpdateSerializer
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        ShoppingCartIngredient.objects.remove_from_carts([instance])
+        instance.delete()
+
     @action(
         detail=True,
         methods=('post', 'delete'),
         url_path='shopping_cart',
         permission_classes=(IsAuthenticated,),
+        throttle_classes=(ScopedTokenBucketThrottle,),
+        throttle_scope='shopping_cart',
     )
     def shopping_cart(self, request, **kwargs):
         recipe = get_object_or_404(Recipe, pk=self.kwargs.get('pk'))
-        serializer = RecipeSmallSerializer(recipe)
-        return self.validator_create_delete(
-            request, ShoppingList, serializer, recipe
+        serializer = RecipeSmallSerializer(
+            recipe, context={'request': request}
         )
+        with transaction.atomic():
+            response = self.validator_create_delete(
+                request, ShoppingList, serializer, recipe, 'in_carts_count'
+            )
+            if response.status_code == status.HTTP_201_CREATED:
+                ShoppingCartIngredient.objects.add_recipe(
+                    request.user, recipe
+                )
+            elif response.status_code == status.HTTP_204_NO_CONTENT:
+                ShoppingCartIngredient.objects.remove_recipe(
+                    request.user, recipe
+                )
+        return response
 
     @action(
         detail=True,
         methods=('post', 'delete'),
         url_path='favorite',
         permission_classes=(IsAuthenticated,),
+        throttle_classes=(ScopedTokenBucketThrottle,),
+        throttle_scope='favorite',
     )
     def favorite(self, request, **kwargs):
         recipe = get_object_or_404(Recipe, pk=self.kwargs.get('pk'))
-        serializer = RecipeSmallSerializer(recipe)
+        serializer = RecipeSmallSerializer(
+            recipe, context={'request': request}
+        )
         return self.validator_create_delete(
-            request, Favorite, serializer, recipe
+            request, Favorite, serializer, recipe, 'favorites_count'
         )
 
-    def validator_create_delete(self, request, model, serializer, recipe):
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=(IsAuthenticated,),
+        throttle_classes=(ScopedTokenBucketThrottle,),
+        throttle_scope='shopping_cart_batch',
+    )
+    def shopping_cart_batch(self, request):
+        """Несколько рецептов в корзину или из неё: {"recipes": [id, ...]}."""
+        with transaction.atomic():
+            results, changed = self.batch_create_delete(
+                request, ShoppingList, 'in_carts_count', CART
+            )
+            if changed and request.method == 'POST':
+                ShoppingCartIngredient.objects.add_recipes(
+                    request.user, changed
+                )
+            elif changed:
+                ShoppingCartIngredient.objects.remove_recipes(
+                    request.user, changed
+                )
+        return Response({'results': results})
+
+    @action(
+        detail=False,
+        methods=('post', 'delete'),
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=(IsAuthenticated,),
+        throttle_classes=(ScopedTokenBucketThrottle,),
+        throttle_scope='favorite_batch',
+    )
+    def favorite_batch(self, request):
+        """Несколько рецептов в избранное или из него."""
+        with transaction.atomic():
+            results, _ = self.batch_create_delete(
+                request, Favorite, 'favorites_count', FAVORITES
+            )
+        return Response({'results': results})
+
+    @staticmethod
+    def create_rows(model, user, recipe_ids):
+        """Вставляет строки и возвращает id рецептов, которые
+        действительно добавлены.
+
+        Обычно это один bulk_create. Если параллельный запрос успел
+        добавить часть рецептов, пачка откатывается до точки
+        сохранения, и строки вставляются по одной, как в
+        validator_create_delete.
+        """
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    model(user=user, recipe_id=pk) for pk in recipe_ids
+                )
+            return list(recipe_ids)
+        except IntegrityError:
+            pass
+        created = []
+        for pk in recipe_ids:
+            try:
+                with transaction.atomic():
+                    model.objects.create(user=user, recipe_id=pk)
+            except IntegrityError:
+                continue
+            created.append(pk)
+        return created
+
+    @staticmethod
+    def delete_rows(model, user, recipe_ids):
+        """Удаляет строки и возвращает id рецептов, которые
+        действительно удалены.
+
+        Строки блокируются select_for_update: параллельная пачка
+        ждёт коммита и уже не находит удалённых строк, поэтому
+        счётчики и итоги корзины не уменьшаются дважды.
+        """
+        rows = dict(model.objects.select_for_update().filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('pk', 'recipe_id'))
+        if rows:
+            model.objects.filter(pk__in=rows).delete()
+        return list(rows.values())
+
+    def batch_create_delete(self, request, model, counter, relation):
+        """Рецепты и их наличие в списке проверяются одним запросом.
+
+        Счётчики и итоги корзины меняются только по строкам, которые
+        действительно вставлены или удалены. Возвращает статус по
+        каждому id и id, которые изменились.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        present = dict(Recipe.objects.filter(pk__in=ids).annotate(
+            present=Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            ))
+        ).order_by().values_list('pk', 'present'))
         if request.method == 'POST':
-            if model.objects.filter(
-                    recipe=recipe, user=self.request.user).exists():
+            changed = self.create_rows(model, user, [
+                pk for pk in ids if pk in present and not present[pk]
+            ])
+            if changed:
+                # bulk_create не отправляет post_save.
+                bump_relation_on_commit(user.id, relation)
+            delta, done, unchanged = 1, 'added', 'exists'
+        else:
+            changed = self.delete_rows(model, user, [
+                pk for pk in ids if present.get(pk)
+            ])
+            delta, done, unchanged = -1, 'removed', 'missing'
+        if changed:
+            Recipe.objects.filter(pk__in=changed).update(
+                **{counter: F(counter) + delta}
+            )
+        changed_ids = set(changed)
+        return [
+            {'id': pk,
+             'status': 'not_found' if pk not in present
+             else done if pk in changed_ids else unchanged}
+            for pk in ids
+        ], changed
+
+    @staticmethod
+    def change_counter(recipe, counter, delta):
+        Recipe.objects.filter(pk=recipe.pk).update(
+            **{counter: F(counter) + delta}
+        )
+
+    def validator_create_delete(self, request, model, serializer, recipe,
+                                counter):
+        if request.method == 'POST':
+            try:
+                with transaction.atomic():
+                    model.objects.create(recipe=recipe, user=request.user)
+                    self.change_counter(recipe, counter, 1)
+            except IntegrityError:
                 return Response(
                     'Нельзя повторно добавить рецепт',
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            model.objects.create(recipe=recipe, user=self.request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if not model.objects.filter(
-                recipe=recipe, user=self.request.user
-        ).exists():
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(
+                recipe=recipe, user=request.user
+            ).delete()
+            if deleted:
+                self.change_counter(recipe, counter, -deleted)
+        if not deleted:
             return Response(
                 'Вы не добавляли этот рецепт',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        recipe = model.objects.filter(recipe=recipe, user=self.request.user)
-        recipe.delete()
         return Response(
             'Рецепт удален из вашего списка',
             status=status.HTTP_204_NO_CONTENT
         )
 
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        """Рецепты авторов, на которых подписан пользователь."""
+        page = self.paginate_queryset(feed_queryset(request.user))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=False,
         url_path='download_shopping_cart',
         permission_classes=(IsAuthenticated,),
-        pagination_class=None
+        pagination_class=None,
+        renderer_classes=SHOPPING_LIST_RENDERERS
     )
     def download_shopping_cart(self, request):
-
-        recipe_list = Recipe.objects.filter(
-            shopping_list_users__user=self.request.user
-        )
-        ingredient_list = Ingredient.objects.filter(
-            ingredient_recipes__recipe__in=recipe_list
-        ).annotate(amount=Sum('ingredient_recipes__amount'))
-
-        my_file = create_pdf('Список покупок', ingredient_list)
-        return FileResponse(
-            my_file,
-            as_attachment=True,
-            filename='shopping_list.pdf',
-            status=status.HTTP_200_OK
+        """Выгрузка корзины: ?format=pdf|txt|csv|json, по умолчанию PDF."""
+        return export_response(
+            request.user, request.accepted_renderer.format,
+            stream=self.stream_exports
         )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
     pagination_class = None
+    reference_payload = ReferencePayload(INGREDIENTS_VERSION)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_AUTOCOMPLETE_INDEX:
+            ingredient_index.refresh()
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
 class IngredientWeightViewSet(viewsets.ReadOnlyModelViewSet):
@@ -126,15 +321,18 @@ class IngredientWeightViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (AllowAny,)
+    reference_payload = ReferencePayload(TAGS_VERSION)
 
 
 class SubscribeCreateDeleteView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ScopedTokenBucketThrottle]
+    throttle_scope = 'subscribe'
 
     @staticmethod
     def post(request, id):
@@ -143,17 +341,28 @@ class SubscribeCreateDeleteView(APIView):
             data=data, context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        try:
+            with transaction.atomic():
+                serializer.save()
+                FeedEntry.objects.backfill(
+                    request.user.id, id, settings.FEED_BACKFILL_LIMIT
+                )
+        except IntegrityError:
+            return Response(
+                {'non_field_errors': ['Подписка уже есть']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
+    @transaction.atomic
     def delete(request, id):
-        user = request.user
-        author = get_object_or_404(User, id=id)
-        instance = get_object_or_404(
-            Follow, user=user, author=author
-        )
-        instance.delete()
+        deleted, _ = Follow.objects.filter(
+            user=request.user, author_id=id
+        ).delete()
+        if not deleted:
+            raise Http404
+        FeedEntry.objects.prune(request.user.id, id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -164,15 +373,40 @@ class UserViewSet(DjUserViewSet):
         detail=False,
         permission_classes=[IsAuthenticated],
         url_path='subscriptions',
-        pagination_class=CustomPagination
+        pagination_class=SubscriptionPagination
     )
     def subscriptions(self, request):
-        user = request.user
-        queryset = Follow.objects.filter(user=user)
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit is not None:
+            try:
+                recipes_limit = int(recipes_limit)
+                if recipes_limit < 0:
+                    raise ValueError
+            except ValueError:
+                raise ValidationError({
+                    'recipes_limit': 'Должно быть неотрицательным целым числом'
+                })
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author_id=OuterRef('author_id')
+                ).values('pk')[:recipes_limit]
+            ))
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).annotate(
+            follow_id=F('following__id'),
+            is_subscribed=Value(True),
+            recipes_count=Count('author_recipes'),
+        ).prefetch_related(
+            Prefetch('author_recipes', queryset=recipes,
+                     to_attr='recipes_preview')
+        ).order_by('-follow_id')
         pages = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
             pages,
             many=True,
-            context={'request': request}
+            context={'request': request, 'recipes_limit': recipes_limit}
         )
         return self.get_paginated_response(serializer.data)
@@ -1,4 +1,6 @@
 import os
+import tempfile
+from itertools import zip_longest
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -33,6 +35,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -41,7 +44,47 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'foodgram.urls'
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'False') == 'True'
+REQUEST_DUPLICATE_QUERIES = int(os.getenv('REQUEST_DUPLICATE_QUERIES', 3))
+REQUEST_PROFILE_SAMPLE_RATE = float(
+    os.getenv('REQUEST_PROFILE_SAMPLE_RATE', 0)
+)
+REQUEST_PROFILE_SLOW_MS = int(os.getenv('REQUEST_PROFILE_SLOW_MS', 500))
+REQUEST_PROFILE_DIR = os.getenv(
+    'REQUEST_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles')
+)
+
+if REQUEST_PROFILING:
+    MIDDLEWARE.insert(0, 'api.middleware.RequestProfilingMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {
+            'format': '%(asctime)s, %(levelname)s, %(name)s, %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'plain',
+        },
+    },
+    'loggers': {
+        'foodgram.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+# Включается в foodgram/asgi.py. Профилирующий middleware синхронный,
+# с REQUEST_PROFILING=True async-view исполняются через async_to_sync.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
+ROOT_URLCONF = 'foodgram.asgi_urls' if ASYNC_VIEWS else 'foodgram.urls'
 
 TEMPLATES = [
     {
@@ -68,10 +111,62 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        # Django 4.1+; для 3.2 проверку делает api.db_router.
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS=host[:port],... и/или
+# DB_REPLICA_NAMES=name,... (для SQLite — файлы). Недостающие
+# параметры берутся из default.
+for number, (host, name) in enumerate(zip_longest(
+    filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')),
+    filter(None, os.getenv('DB_REPLICA_NAMES', '').split(',')),
+), start=1):
+    host, _, port = (host or '').partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host or DATABASES['default']['HOST'],
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+DATABASE_REPLICA_PATHS = (
+    '/api/recipes/',
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/users/subscriptions/',
+)
+DATABASE_REPLICA_PIN_SECONDS = int(
+    os.getenv('DATABASE_REPLICA_PIN_SECONDS', 5)
+)
+
+# Версии данных, счётчики throttling, кэш токенов и count должны
+# быть общими для всех процессов gunicorn: с CACHE_LOCATION
+# (redis://redis:6379/1) по умолчанию используется django-redis.
+# Без него — LocMemCache, который годится только для разработки и
+# тестов; при DEBUG = False об этом предупреждает проверка api.W001.
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', (
+            'django_redis.cache.RedisCache' if CACHE_LOCATION
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        )),
+        'LOCATION': CACHE_LOCATION,
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 600))
+REFERENCE_CACHE_MAX_AGE = int(os.getenv('REFERENCE_CACHE_MAX_AGE', 86400))
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 60)
+)
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,6 +197,18 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+SHOPPING_LIST_CACHE_DIR = os.getenv(
+    'SHOPPING_LIST_CACHE_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-shopping-lists')
+)
+
+IMAGE_PROCESSING_EXECUTOR = os.getenv('IMAGE_PROCESSING_EXECUTOR', 'thread')
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+# Фоновые задачи ленты подписок выполняются в том же пуле.
+FEED_FANOUT_BATCH_SIZE = int(os.getenv('FEED_FANOUT_BATCH_SIZE', 1000))
+FEED_BACKFILL_LIMIT = int(os.getenv('FEED_BACKFILL_LIMIT', 200))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
@@ -111,13 +218,39 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachingTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
     ],
+    # api.throttling.ScopedTokenBucketThrottle: 'запросов/период:ёмкость'.
+    'DEFAULT_THROTTLE_RATES': {
+        'favorite': os.getenv('FAVORITE_THROTTLE_RATE', '60/min:20'),
+        'shopping_cart': os.getenv('SHOPPING_CART_THROTTLE_RATE',
+                                   '60/min:20'),
+        'subscribe': os.getenv('SUBSCRIBE_THROTTLE_RATE', '30/min:10'),
+        'favorite_batch': os.getenv('FAVORITE_BATCH_THROTTLE_RATE',
+                                    '10/min:5'),
+        'shopping_cart_batch': os.getenv('SHOPPING_CART_BATCH_THROTTLE_RATE',
+                                         '10/min:5'),
+    },
 }
 
+INGREDIENT_AUTOCOMPLETE_INDEX = (
+    os.getenv('INGREDIENT_AUTOCOMPLETE_INDEX', 'True') == 'True'
+)
+INGREDIENT_AUTOCOMPLETE_LIMIT = int(
+    os.getenv('INGREDIENT_AUTOCOMPLETE_LIMIT', 50)
+)
+
+RECIPES_BATCH_LIMIT = int(os.getenv('RECIPES_BATCH_LIMIT', 100))
+
+RELATIONS_CACHE_TIMEOUT = int(os.getenv('RELATIONS_CACHE_TIMEOUT', 3600))
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_LOCAL_TIMEOUT', 60))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 600))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
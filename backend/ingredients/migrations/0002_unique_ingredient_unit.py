@@ -0,0 +1,68 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:18
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_cart_totals(ShoppingCartIngredient, extra, keep_id):
+    """Переносит итоги корзин с дубликатов на оставшийся ингредиент,
+    складывая количества; иначе удаление дубликата удалило бы их
+    каскадом."""
+    totals = {}
+    for user_id, amount in ShoppingCartIngredient.objects.filter(
+        ingredient__in=extra
+    ).values_list('user_id', 'amount'):
+        totals[user_id] = totals.get(user_id, 0) + amount
+    if not totals:
+        return
+    kept = {
+        row.user_id: row for row in ShoppingCartIngredient.objects.filter(
+            ingredient_id=keep_id, user_id__in=totals
+        )
+    }
+    for row in kept.values():
+        row.amount += totals.pop(row.user_id)
+    ShoppingCartIngredient.objects.bulk_update(kept.values(), ['amount'])
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(
+            user_id=user_id, ingredient_id=keep_id, amount=amount
+        )
+        for user_id, amount in totals.items()
+    )
+    ShoppingCartIngredient.objects.filter(ingredient__in=extra).delete()
+
+
+def merge_duplicates(apps, schema_editor):
+    Ingredient = apps.get_model('ingredients', 'Ingredient')
+    IngredientWeight = apps.get_model('recipes', 'IngredientWeight')
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        extra = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep_id'])
+        IngredientWeight.objects.filter(ingredient__in=extra).update(
+            ingredient_id=group['keep_id']
+        )
+        merge_cart_totals(ShoppingCartIngredient, extra, group['keep_id'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0001_initial'),
+        ('recipes', '0005_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_unit'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+INDEX_NAME = 'ingredient_upper_name_pattern'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        'ON ingredients_ingredient (UPPER(name) varchar_pattern_ops)'
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0002_unique_ingredient_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -8,6 +8,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'ингредиент'
         verbose_name_plural = 'ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_unit',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.measurement_unit}'
@@ -1,6 +1,27 @@
+from contextlib import contextmanager
+
 from django.contrib import admin
+from django.db import transaction
+
+from recipes.models import (IngredientWeight, Recipe, ShoppingCartIngredient,
+                            Tag)
 
-from recipes.models import IngredientWeight, Recipe, Tag
+
+@contextmanager
+def cart_totals_follow(recipe_ids):
+    """Переносит изменение состава рецептов внутри блока в итоги
+    корзин, как это делает API."""
+    carts = ShoppingCartIngredient.objects
+    with transaction.atomic():
+        old_amounts = {
+            recipe_id: carts.recipe_amounts(recipe_id)
+            for recipe_id in recipe_ids
+        }
+        yield
+        for recipe_id, amounts in old_amounts.items():
+            carts.change_recipe(
+                recipe_id, amounts, carts.recipe_amounts(recipe_id)
+            )
 
 
 class IngredientWeightInline(admin.TabularInline):
@@ -16,17 +37,36 @@ class RecipeAdmin(admin.ModelAdmin):
                     'name',
                     'image',
                     'text',
-                    'cooking_time')
+                    'cooking_time',
+                    'favorites_count',
+                    'in_carts_count')
     search_fields = ('name',)
     list_filter = ('name', 'author', 'tags')
     empty_value_display = '-пусто-'
-    readonly_fields = ('in_favorite',)
+    readonly_fields = ('favorites_count', 'in_carts_count')
     inlines = (IngredientWeightInline,)
 
-    def in_favorite(self, obj):
-        return obj.in_favorite.all().count()
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.search(search_term), False
+
+    def save_related(self, request, form, formsets, change):
+        with cart_totals_follow([form.instance.pk]):
+            super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(
+            pk=form.instance.pk
+        ).refresh_search_documents()
 
-    in_favorite.short_description = 'Количество добавлений в избранное'
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        ShoppingCartIngredient.objects.remove_from_carts([obj])
+        super().delete_model(request, obj)
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        ShoppingCartIngredient.objects.remove_from_carts(queryset)
+        super().delete_queryset(request, queryset)
 
 
 @admin.register(Tag)
@@ -39,3 +79,21 @@ class IngredientWeightAdmin(admin.ModelAdmin):
     list_display = ('id', 'ingredient', 'amount')
     search_fields = ('ingredient',)
     empty_value_display = '-пусто-'
+
+    def save_model(self, request, obj, form, change):
+        recipe_ids = {obj.recipe_id}
+        if change:
+            recipe_ids.update(IngredientWeight.objects.filter(
+                pk=obj.pk
+            ).values_list('recipe_id', flat=True))
+        with cart_totals_follow(recipe_ids):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with cart_totals_follow([obj.recipe_id]):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        with cart_totals_follow(recipe_ids):
+            super().delete_queryset(request, queryset)
@@ -1,7 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
     verbose_name = 'рецепты'
+
+    def ready(self):
+        from .search import sync_sqlite_search
+
+        post_migrate.connect(sync_sqlite_search, sender=self)
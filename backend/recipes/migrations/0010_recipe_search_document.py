@@ -0,0 +1,80 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:40
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+from recipes.search import drop_sqlite_search, ensure_sqlite_search
+
+INDEX_NAME = 'recipe_search_idx'
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientWeight = apps.get_model('recipes', 'IngredientWeight')
+    tags = defaultdict(list)
+    for recipe_id, name in Recipe.tags.through.objects.values_list(
+        'recipe_id', 'tag__name'
+    ):
+        tags[recipe_id].append(name)
+    ingredients = defaultdict(list)
+    for recipe_id, name in IngredientWeight.objects.values_list(
+        'recipe_id', 'ingredient__name'
+    ):
+        ingredients[recipe_id].append(name)
+    recipes = list(Recipe.objects.only('pk', 'text'))
+    for recipe in recipes:
+        recipe.search_document = '\n'.join((
+            ' '.join(tags[recipe.pk]), ' '.join(ingredients[recipe.pk]),
+            recipe.text,
+        ))
+    Recipe.objects.bulk_update(recipes, ('search_document',),
+                               batch_size=1000)
+
+
+def search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    # То же выражение, что recipes.search.search_vector(), иначе
+    # планировщик не использует индекс.
+    return GinIndex(
+        SearchVector('name', weight='A', config='russian')
+        + SearchVector('search_document', weight='B', config='russian'),
+        name=INDEX_NAME,
+    )
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(
+            apps.get_model('recipes', 'Recipe'), search_index()
+        )
+    else:
+        ensure_sqlite_search(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(
+            apps.get_model('recipes', 'Recipe'), search_index()
+        )
+    else:
+        drop_sqlite_search(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='поисковый документ'),
+        ),
+        migrations.RunPython(fill_search_documents, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,13 +1,92 @@
-from django.db import models
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connections, models, transaction
+from django.db.models import Count, F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
 
 from ingredients.models import Ingredient
-from users.models import User
+from users.models import Favorite, Follow, ShoppingList, User
+
+from .search import (FTS_TABLE, build_search_document, postgres_search,
+                     sqlite_search)
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    @staticmethod
+    def relation_count(model):
+        return Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk'))
+            .values('recipe').annotate(total=Count('pk')).values('total')
+        ), 0)
+
+    def recount_counters(self):
+        """Пересчитывает разошедшиеся счётчики одним UPDATE,
+        возвращает число исправленных рецептов."""
+        favorites = self.relation_count(Favorite)
+        in_carts = self.relation_count(ShoppingList)
+        return self.annotate(
+            actual_favorites_count=favorites,
+            actual_in_carts_count=in_carts,
+        ).exclude(
+            favorites_count=F('actual_favorites_count'),
+            in_carts_count=F('actual_in_carts_count'),
+        ).update(favorites_count=favorites, in_carts_count=in_carts)
+
+    def search(self, value):
+        """Полнотекстовый поиск, результаты отсортированы по
+        релевантности."""
+        if connections[self.db].vendor == 'postgresql':
+            return postgres_search(self, value)
+        return sqlite_search(self, value)
+
+    def refresh_search_documents(self, batch_size=1000):
+        """Пересобирает search_document из описания, тегов и
+        ингредиентов, возвращает число обработанных рецептов."""
+        ids = list(self.order_by().values_list('pk', flat=True))
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            tags = defaultdict(list)
+            for recipe_id, name in Recipe.tags.through.objects.filter(
+                recipe_id__in=batch
+            ).values_list('recipe_id', 'tag__name'):
+                tags[recipe_id].append(name)
+            ingredients = defaultdict(list)
+            for recipe_id, name in IngredientWeight.objects.filter(
+                recipe_id__in=batch
+            ).values_list('recipe_id', 'ingredient__name'):
+                ingredients[recipe_id].append(name)
+            recipes = list(
+                Recipe.objects.filter(pk__in=batch).only('pk', 'text')
+            )
+            for recipe in recipes:
+                recipe.search_document = build_search_document(
+                    recipe.text, tags[recipe.pk], ingredients[recipe.pk]
+                )
+            Recipe.objects.bulk_update(recipes, ('search_document',))
+        return len(ids)
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты за постоянное число
+        запросов, независимо от размера страницы. Флаги пользователя
+        сериализатор берёт из api.relations."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'weight',
+                queryset=IngredientWeight.objects.select_related('ingredient')
+            ),
+        )
 
 
 class Recipe(models.Model):
     name = models.CharField('название', max_length=200)
     text = models.TextField('описание')
     image = models.ImageField('картинка', upload_to='media/recipes/images/')
+    image_variants = models.JSONField(
+        'уменьшенные копии картинки', default=dict, blank=True
+    )
     author = models.ForeignKey(
         User,
         verbose_name='автор',
@@ -24,15 +103,55 @@ class Recipe(models.Model):
     cooking_time = models.PositiveSmallIntegerField(
         'время приготовления (в минутах)'
     )
+    pub_date = models.DateTimeField('дата публикации', auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'количество добавлений в избранное', default=0
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'количество добавлений в список покупок', default=0
+    )
+    search_document = models.TextField(
+        'поисковый документ', blank=True, default='', editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
+        ordering = ('-pub_date', '-id')
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='recipe_author_idx'),
+            models.Index(fields=('-favorites_count', '-pub_date', '-id'),
+                         name='recipe_popular_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeSearchEntry(models.Model):
+    """Строка таблицы FTS5, по которой ищет sqlite_search.
+
+    Таблицу и триггеры ведёт recipes.search, модель нужна только для
+    соединения с рецептами. В PostgreSQL такой таблицы нет.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='search_entry',
+    )
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
+
+
 class Tag(models.Model):
     name = models.CharField('название', max_length=200, unique=True)
     color = models.CharField('цветовой HEX-код', max_length=7)
@@ -68,3 +187,283 @@ class IngredientWeight(models.Model):
 
     def __str__(self):
         return f'{self.ingredient} - {self.amount}'
+
+
+class ShoppingCartIngredientQuerySet(models.QuerySet):
+
+    def add_amounts(self, user_ids, amounts):
+        """Прибавляет количества {ingredient_id: amount} к итогам
+        корзин пользователей. Отрицательные значения вычитаются,
+        строки с нулевым итогом удаляются."""
+        amounts = {
+            ingredient_id: amount
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        user_ids = list(user_ids)
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            rows = {
+                (row.user_id, row.ingredient_id): row
+                for row in self.select_for_update().filter(
+                    user_id__in=user_ids, ingredient_id__in=amounts
+                )
+            }
+            changed, created, deleted = [], [], []
+            for user_id in user_ids:
+                for ingredient_id, amount in amounts.items():
+                    row = rows.get((user_id, ingredient_id))
+                    if row is None:
+                        if amount > 0:
+                            created.append(self.model(
+                                user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                amount=amount,
+                            ))
+                    elif row.amount + amount > 0:
+                        row.amount += amount
+                        changed.append(row)
+                    else:
+                        deleted.append(row.pk)
+            self.bulk_update(changed, ['amount'])
+            self.bulk_create(created)
+            if deleted:
+                self.filter(pk__in=deleted).delete()
+
+    @staticmethod
+    def recipe_amounts(recipe):
+        return dict(
+            IngredientWeight.objects.filter(recipe=recipe)
+            .values_list('ingredient_id', 'amount')
+        )
+
+    @staticmethod
+    def recipes_amounts(recipe_ids):
+        """Суммы по ингредиентам сразу для нескольких рецептов."""
+        return dict(
+            IngredientWeight.objects.filter(recipe_id__in=recipe_ids)
+            .order_by().values('ingredient_id')
+            .annotate(total=Sum('amount'))
+            .values_list('ingredient_id', 'total')
+        )
+
+    def add_recipe(self, user, recipe):
+        self.add_amounts([user.id], self.recipe_amounts(recipe))
+
+    def remove_recipe(self, user, recipe):
+        self.add_amounts([user.id], {
+            ingredient_id: -amount
+            for ingredient_id, amount in self.recipe_amounts(recipe).items()
+        })
+
+    def add_recipes(self, user, recipe_ids):
+        self.add_amounts([user.id], self.recipes_amounts(recipe_ids))
+
+    def remove_recipes(self, user, recipe_ids):
+        self.add_amounts([user.id], {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in self.recipes_amounts(recipe_ids).items()
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта во все корзины,
+        в которых он лежит."""
+        delta = {
+            ingredient_id: (new_amounts.get(ingredient_id, 0)
+                            - old_amounts.get(ingredient_id, 0))
+            for ingredient_id in {*old_amounts, *new_amounts}
+        }
+        user_ids = ShoppingList.objects.filter(
+            recipe=recipe
+        ).values_list('user_id', flat=True)
+        self.add_amounts(user_ids, delta)
+
+    def remove_from_carts(self, recipes):
+        """Вычитает рецепты из всех корзин перед их удалением: после
+        него не останется ни состава, ни строк ShoppingList."""
+        for recipe in recipes:
+            self.change_recipe(recipe, self.recipe_amounts(recipe), {})
+
+    @staticmethod
+    def expected(user_ids=None):
+        """Итоги корзин, посчитанные заново по ShoppingList."""
+        carts = ShoppingList.objects.all()
+        if user_ids is not None:
+            carts = carts.filter(user_id__in=user_ids)
+        totals = carts.values(
+            'user_id', 'recipe__weight__ingredient_id'
+        ).annotate(total=Sum('recipe__weight__amount'))
+        return {
+            (row['user_id'], row['recipe__weight__ingredient_id']):
+                row['total']
+            for row in totals
+            if row['recipe__weight__ingredient_id'] is not None
+        }
+
+    def rebuild(self, user_ids=None):
+        expected = self.expected(user_ids)
+        with transaction.atomic():
+            rows = self.all()
+            if user_ids is not None:
+                rows = rows.filter(user_id__in=user_ids)
+            rows.delete()
+            self.bulk_create(
+                (self.model(user_id=user_id, ingredient_id=ingredient_id,
+                            amount=amount)
+                 for (user_id, ingredient_id), amount in expected.items()),
+                batch_size=1000,
+            )
+        return len(expected)
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        verbose_name='пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='ингридиент',
+        on_delete=models.CASCADE,
+        related_name='cart_totals',
+    )
+    amount = models.PositiveIntegerField('количество')
+
+    objects = ShoppingCartIngredientQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'итог корзины'
+        verbose_name_plural = 'итоги корзин'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_cart_ingredient',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} - {self.amount}'
+
+
+class FeedEntryQuerySet(models.QuerySet):
+
+    def entries(self, user_ids, recipes):
+        return (
+            self.model(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id, pub_date=pub_date)
+            for user_id in user_ids
+            for recipe_id, author_id, pub_date in recipes
+        )
+
+    def fan_out(self, recipe, batch_size):
+        """Раскладывает рецепт по лентам подписчиков автора.
+
+        Подписчики читаются и записываются пачками не больше
+        batch_size, чтобы автор с большой аудиторией не держал одну
+        длинную транзакцию. Возвращает число подписчиков.
+        """
+        recipes = [(recipe.pk, recipe.author_id, recipe.pub_date)]
+        followers = Follow.objects.filter(
+            author_id=recipe.author_id
+        ).order_by('pk').values_list('pk', 'user_id')
+        last_pk, total = 0, 0
+        while True:
+            batch = list(followers.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return total
+            self.bulk_create(
+                self.entries((user_id for _, user_id in batch), recipes),
+                ignore_conflicts=True,
+            )
+            last_pk = batch[-1][0]
+            total += len(batch)
+
+    def backfill(self, user_id, author_id, limit):
+        """Добавляет в ленту последние limit рецептов автора."""
+        recipes = Recipe.objects.filter(author_id=author_id).values_list(
+            'pk', 'author_id', 'pub_date'
+        )[:limit]
+        self.bulk_create(
+            self.entries([user_id], recipes), ignore_conflicts=True
+        )
+
+    def prune(self, user_id, author_id):
+        return self.filter(user_id=user_id, author_id=author_id).delete()[0]
+
+    def rebuild(self, user_ids=None, batch_size=1000):
+        """Заполняет ленты заново по текущим подпискам, одним
+        проходом по соединению подписок с рецептами."""
+        follows = Follow.objects.filter(author__author_recipes__isnull=False)
+        if user_ids is not None:
+            follows = follows.filter(user_id__in=user_ids)
+        rows = follows.values_list(
+            'user_id', 'author__author_recipes__id', 'author_id',
+            'author__author_recipes__pub_date',
+        ).order_by()
+        with transaction.atomic():
+            entries = self.all()
+            if user_ids is not None:
+                entries = entries.filter(user_id__in=user_ids)
+            entries.delete()
+            rows = rows.iterator(chunk_size=batch_size)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    return
+                self.bulk_create(
+                    self.model(user_id=user_id, recipe_id=recipe_id,
+                               author_id=author_id, pub_date=pub_date)
+                    for user_id, recipe_id, author_id, pub_date in batch
+                )
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика (fan-out on write).
+
+    author и pub_date скопированы из рецепта: лента читается по
+    индексу (user, -pub_date) без сортировки, а отписка удаляет
+    записи по (user, author).
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='подписчик',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='рецепт',
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='автор',
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField('дата публикации')
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
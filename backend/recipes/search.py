@@ -0,0 +1,133 @@
+"""Полнотекстовый поиск по рецептам.
+
+PostgreSQL: SearchVector по name (вес A) и search_document (вес B)
+с русской морфологией и GIN-индекс по тому же выражению.
+SQLite (локальная разработка): таблица FTS5, которую заполняют
+триггеры на recipes_recipe. Морфологии там нет, слова ищутся по
+префиксу.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, F, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+SEARCH_INDEX = 'recipe_search_idx'
+FTS_TABLE = 'recipes_recipe_search'
+FTS_WORD = re.compile(r'\w+')
+SEARCH_ORDERING = ('-search_rank', '-pub_date', '-id')
+
+
+def search_vector():
+    """Должно совпадать с выражением индекса в миграции 0010."""
+    # contrib.postgres импортирует psycopg2, которого может не быть
+    # при локальной работе с SQLite.
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('search_document', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def build_search_document(text, tags, ingredients):
+    return '\n'.join((' '.join(tags), ' '.join(ingredients), text))
+
+
+def postgres_search(queryset, value):
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+
+    query = SearchQuery(value, config=SEARCH_CONFIG)
+    return queryset.alias(
+        search_vector=search_vector()
+    ).filter(search_vector=query).alias(
+        search_rank=SearchRank(F('search_vector'), query)
+    ).order_by(*SEARCH_ORDERING)
+
+
+def fts_normalize(value):
+    return value.lower().replace('ё', 'е')
+
+
+def sqlite_search(queryset, value):
+    words = FTS_WORD.findall(fts_normalize(value))
+    if not words:
+        return queryset.none()
+    match = ' '.join(f'"{word}"*' for word in words)
+    # bm25() считается за один проход по совпадениям только при
+    # соединении с таблицей FTS5 (RecipeSearchEntry); коррелированный
+    # подзапрос повторял бы разбор префиксов для каждой строки.
+    return queryset.filter(
+        Q(search_entry__isnull=False),
+        RawSQL(f'{FTS_TABLE} MATCH %s', (match,),
+               output_field=BooleanField()),
+    ).alias(
+        search_rank=RawSQL(f'-bm25({FTS_TABLE}, 10.0, 1.0)', ())
+    ).order_by(*SEARCH_ORDERING)
+
+
+def fts_column(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+SQLITE_SEARCH_SQL = (
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    'name, search_document, tokenize="unicode61 remove_diacritics 2")',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert '
+    'AFTER INSERT ON recipes_recipe BEGIN '
+    f'INSERT INTO {FTS_TABLE} (rowid, name, search_document) VALUES '
+    f'(new.id, {fts_column("new.name")}, '
+    f'{fts_column("new.search_document")}); END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update '
+    'AFTER UPDATE OF name, search_document ON recipes_recipe BEGIN '
+    f'UPDATE {FTS_TABLE} SET name = {fts_column("new.name")}, '
+    f'search_document = {fts_column("new.search_document")} '
+    'WHERE rowid = new.id; END',
+    f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete '
+    'AFTER DELETE ON recipes_recipe BEGIN '
+    f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END',
+    f'DELETE FROM {FTS_TABLE}',
+    f'INSERT INTO {FTS_TABLE} (rowid, name, search_document) '
+    f'SELECT id, {fts_column("name")}, {fts_column("search_document")} '
+    'FROM recipes_recipe',
+)
+
+
+def ensure_sqlite_search(connection):
+    """Создаёт таблицу FTS5 и триггеры, если их нет, и заново
+    заполняет таблицу.
+
+    Вызывается после каждой миграции: SQLite пересоздаёт таблицу
+    при изменении схемы, и триггеры при этом пропадают.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if 'recipes_recipe' not in connection.introspection.table_names(
+            cursor
+        ):
+            return
+        columns = {
+            column.name for column in
+            connection.introspection.get_table_description(
+                cursor, 'recipes_recipe'
+            )
+        }
+        if 'search_document' not in columns:
+            return
+        for statement in SQLITE_SEARCH_SQL:
+            cursor.execute(statement)
+
+
+def sync_sqlite_search(using, **kwargs):
+    ensure_sqlite_search(connections[using])
+
+
+def drop_sqlite_search(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for suffix in ('insert', 'update', 'delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
@@ -1,4 +1,7 @@
 from django.contrib import admin
+from django.db import transaction
+
+from recipes.models import Recipe, ShoppingCartIngredient
 
 from .models import Favorite, Follow, ShoppingList
 
@@ -12,19 +15,56 @@ class FollowAdmin(admin.ModelAdmin):
     )
 
 
-@admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class RecipeRelationAdmin(admin.ModelAdmin):
+    """Избранное и корзина: после каждого изменения пересчитываются
+    счётчики затронутых рецептов."""
     list_display = (
         'id',
         'user',
         'recipe',
     )
 
+    @staticmethod
+    def touched(queryset):
+        """user_id и recipe_id строк queryset."""
+        rows = list(queryset.values_list('user_id', 'recipe_id'))
+        return {row[0] for row in rows}, {row[1] for row in rows}
+
+    def relations_changed(self, user_ids, recipe_ids):
+        Recipe.objects.filter(pk__in=recipe_ids).recount_counters()
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        user_ids, recipe_ids = self.touched(
+            self.model.objects.filter(pk=obj.pk)
+        )
+        super().save_model(request, obj, form, change)
+        self.relations_changed(
+            user_ids | {obj.user_id}, recipe_ids | {obj.recipe_id}
+        )
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.relations_changed({obj.user_id}, {obj.recipe_id})
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        user_ids, recipe_ids = self.touched(queryset)
+        super().delete_queryset(request, queryset)
+        self.relations_changed(user_ids, recipe_ids)
+
+
+@admin.register(Favorite)
+class FavoriteAdmin(RecipeRelationAdmin):
+    pass
+
 
 @admin.register(ShoppingList)
-class ShoppingListAdmin(admin.ModelAdmin):
-    list_display = (
-        'id',
-        'user',
-        'recipe',
-    )
+class ShoppingListAdmin(RecipeRelationAdmin):
+    """Итоги корзин затронутых пользователей пересобираются после
+    каждого изменения."""
+
+    def relations_changed(self, user_ids, recipe_ids):
+        super().relations_changed(user_ids, recipe_ids)
+        ShoppingCartIngredient.objects.rebuild(user_ids)
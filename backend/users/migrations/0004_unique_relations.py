@@ -0,0 +1,64 @@
+# Generated by Django 4.0.6 on 2026-10-18 19:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def remove_duplicates(model, fields):
+    duplicates = model.objects.values(*fields).annotate(
+        keep_id=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    affected_users = set()
+    for group in duplicates:
+        model.objects.filter(
+            **{field: group[field] for field in fields}
+        ).exclude(id=group['keep_id']).delete()
+        affected_users.add(group['user'])
+    return affected_users
+
+
+def deduplicate(apps, schema_editor):
+    remove_duplicates(apps.get_model('users', 'Follow'), ('user', 'author'))
+    remove_duplicates(apps.get_model('users', 'Favorite'), ('user', 'recipe'))
+    ShoppingList = apps.get_model('users', 'ShoppingList')
+    users = remove_duplicates(ShoppingList, ('user', 'recipe'))
+    if not users:
+        return
+    ShoppingCartIngredient = apps.get_model(
+        'recipes', 'ShoppingCartIngredient'
+    )
+    ShoppingCartIngredient.objects.filter(user_id__in=users).delete()
+    totals = ShoppingList.objects.filter(user_id__in=users).values(
+        'user_id', 'recipe__weight__ingredient_id'
+    ).annotate(total=Sum('recipe__weight__amount'))
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(
+            user_id=row['user_id'],
+            ingredient_id=row['recipe__weight__ingredient_id'],
+            amount=row['total'],
+        ) for row in totals if row['recipe__weight__ingredient_id']
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_shoppingcartingredient'),
+        ('users', '0003_alter_shoppinglist_recipe_alter_shoppinglist_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglist',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_list'),
+        ),
+    ]
@@ -21,6 +21,12 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'подписка'
         verbose_name_plural = 'подписки на пользовотелей'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+        ]
 
     def __str__(self):
         return self.author
@@ -43,6 +49,12 @@ class Favorite(models.Model):
     class Meta:
         verbose_name = 'любимый рецепт'
         verbose_name_plural = 'любимые рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite',
+            ),
+        ]
 
     def __str__(self):
         return self.recipe.name
@@ -66,6 +78,12 @@ class ShoppingList(models.Model):
     class Meta:
         verbose_name = 'список покупок'
         verbose_name_plural = 'списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_list',
+            ),
+        ]
 
     def __str__(self):
         return self.recipe.name